@@ -0,0 +1,276 @@
+import asyncio
+import os
+import select
+import subprocess
+import threading
+import time
+import uuid
+
+from sync_metrics import metrics
+
+
+def new_marker():
+    return f"__CLIPSYNC_{uuid.uuid4().hex}__".encode("ascii")
+
+
+def frame_command(command, marker):
+    """Wraps a command so its merged output is followed by '\n<marker> <exit status>\n'."""
+    return b"{ " + command.encode("utf-8") + b"\n} 2>&1 </dev/null; printf '\\n%s %d\\n' '" + marker + b"' $?\n"
+
+
+def split_frame(buffer, marker):
+    """Returns (output, returncode, rest) once the marker line is in buffer, else None."""
+    needle = b"\n" + marker + b" "
+    index = buffer.find(needle)
+    if index == -1:
+        return None
+    end = buffer.find(b"\n", index + len(needle))
+    if end == -1:
+        return None
+    status = buffer[index + len(needle):end].strip()
+    try:
+        returncode = int(status)
+    except ValueError:
+        returncode = -1
+    return buffer[:index], returncode, buffer[end + 1:]
+
+
+class AdbShellSession:
+    """A long-lived `adb shell` process that runs commands with framed output.
+
+    Each command is followed by a unique sentinel line carrying its exit
+    status, so output from consecutive commands never bleeds together and
+    no new `adb` process has to be spawned per call.
+    """
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.process = None
+        self.lock = threading.Lock()
+        self._buffer = b""
+
+    def start(self):
+        metrics.count("subprocesses.adb", device=self.device_id)
+        self.process = subprocess.Popen(
+            ["adb", "-s", self.device_id, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        self._buffer = b""
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.process.terminate()
+            self.process.wait(timeout=2)
+        except Exception:
+            try:
+                self.process.kill()
+            except Exception:
+                pass
+        self.process = None
+        self._buffer = b""
+
+    def run(self, command, timeout=10, text=False):
+        """Runs a shell command and returns a CompletedProcess with merged stdout/stderr."""
+        with self.lock:
+            if not self.is_alive():
+                self.start()
+
+            marker = new_marker()
+            metrics.count("shell_commands", device=self.device_id)
+            try:
+                self.process.stdin.write(frame_command(command, marker))
+                self.process.stdin.flush()
+                output, returncode = self._read_until(marker, timeout)
+            except subprocess.TimeoutExpired:
+                # Session state is unknown after a timeout, start fresh next time
+                self.close()
+                raise
+            except (BrokenPipeError, OSError, EOFError):
+                self.close()
+                raise
+
+        if text:
+            output = output.decode("utf-8", errors="replace")
+        return subprocess.CompletedProcess(command, returncode, output, "" if text else b"")
+
+    def _read_until(self, marker, timeout):
+        fd = self.process.stdout.fileno()
+        deadline = time.time() + timeout
+
+        while True:
+            frame = split_frame(self._buffer, marker)
+            if frame is not None:
+                output, returncode, self._buffer = frame
+                return output, returncode
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(["adb", "-s", self.device_id, "shell"], timeout)
+
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError(f"adb shell session for {self.device_id} closed")
+            self._buffer += chunk
+
+
+class AdbSessionPool:
+    """Keeps one persistent shell session per device and restarts dead ones."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, device_id):
+        with self.lock:
+            session = self.sessions.get(device_id)
+            if session is None:
+                session = AdbShellSession(device_id)
+                self.sessions[device_id] = session
+            return session
+
+    def run(self, device_id, command, timeout=10, text=False):
+        """Runs a command on the device's session, retrying once on a dead session."""
+        session = self.get(device_id)
+        try:
+            return session.run(command, timeout=timeout, text=text)
+        except (BrokenPipeError, EOFError, OSError) as e:
+            print(f"[{device_id}] ADB shell session died ({e}), restarting...")
+            return session.run(command, timeout=timeout, text=text)
+
+    def close(self, device_id):
+        with self.lock:
+            session = self.sessions.pop(device_id, None)
+        if session is not None:
+            session.close()
+
+    def close_all(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+class AsyncAdbShellSession:
+    """asyncio counterpart of AdbShellSession using the same command framing."""
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.process = None
+        self.lock = asyncio.Lock()
+        self._buffer = b""
+
+    async def start(self):
+        metrics.count("subprocesses.adb", device=self.device_id)
+        self.process = await asyncio.create_subprocess_exec(
+            "adb", "-s", self.device_id, "shell",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        self._buffer = b""
+
+    def is_alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def close(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        self._buffer = b""
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), 2)
+        except Exception:
+            try:
+                process.kill()
+            except Exception:
+                pass
+
+    async def run(self, command, timeout=10, text=False):
+        """Runs a shell command and returns a CompletedProcess with merged stdout/stderr."""
+        async with self.lock:
+            if not self.is_alive():
+                await self.start()
+
+            marker = new_marker()
+            metrics.count("shell_commands", device=self.device_id)
+            try:
+                self.process.stdin.write(frame_command(command, marker))
+                await self.process.stdin.drain()
+                output, returncode = await asyncio.wait_for(self._read_until(marker), timeout)
+            except asyncio.TimeoutError:
+                await self.close()
+                raise subprocess.TimeoutExpired(["adb", "-s", self.device_id, "shell"], timeout)
+            except BaseException:
+                # Includes cancellation: the session is mid-command, start fresh next time
+                await self.close()
+                raise
+
+        if text:
+            output = output.decode("utf-8", errors="replace")
+        return subprocess.CompletedProcess(command, returncode, output, "" if text else b"")
+
+    async def _read_until(self, marker):
+        while True:
+            frame = split_frame(self._buffer, marker)
+            if frame is not None:
+                output, returncode, self._buffer = frame
+                return output, returncode
+            chunk = await self.process.stdout.read(65536)
+            if not chunk:
+                raise EOFError(f"adb shell session for {self.device_id} closed")
+            self._buffer += chunk
+
+
+class AsyncAdbSessionPool:
+    """asyncio counterpart of AdbSessionPool."""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def get(self, device_id):
+        session = self.sessions.get(device_id)
+        if session is None:
+            session = AsyncAdbShellSession(device_id)
+            self.sessions[device_id] = session
+        return session
+
+    async def run(self, device_id, command, timeout=10, text=False):
+        """Runs a command on the device's session, retrying once on a dead session."""
+        session = self.get(device_id)
+        try:
+            return await session.run(command, timeout=timeout, text=text)
+        except (BrokenPipeError, ConnectionResetError, EOFError) as e:
+            print(f"[{device_id}] ADB shell session died ({e}), restarting...")
+            return await session.run(command, timeout=timeout, text=text)
+
+    async def close(self, device_id):
+        session = self.sessions.pop(device_id, None)
+        if session is not None:
+            await session.close()
+
+    async def close_all(self):
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for session in sessions:
+            await session.close()
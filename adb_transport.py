@@ -0,0 +1,208 @@
+import asyncio
+import os
+import time
+
+import sync_clipboard as helpers
+from adb_session import AsyncAdbSessionPool
+from image_fingerprint import BytesDigest, bytes_digest
+from sync_metrics import metrics
+from transport import Transport
+
+
+class AdbTransport(Transport):
+    """Clipboard transfers over adb: `am broadcast` for text, exec-in pushes for images,
+    and the single round-trip read script (plus a streamed pull for large images)."""
+
+    name = "adb"
+
+    def __init__(self, sessions=None, link_throughput=None, device_blobs=None, large_text_bytes=None):
+        # Link rates and device blobs are shared with the blocking helpers by default
+        super().__init__(link_throughput or helpers.link_throughput)
+        self.sessions = sessions or AsyncAdbSessionPool()
+        # Texts above this size are gzipped and pushed as a file
+        self.large_text_bytes = large_text_bytes or helpers.LARGE_TEXT_BYTES
+        # Images each device already holds in its on-device blob cache
+        self.device_blobs = device_blobs or helpers.device_blobs
+
+    async def detach(self, device):
+        await self.sessions.close(device)
+
+    async def close_all(self):
+        await self.sessions.close_all()
+
+    # --- Host to device ---
+
+    async def send_text(self, device, text, large_text_bytes=None):
+        text_bytes = text.encode("utf-8")
+        if not helpers.clipboard_text_fits(device, text_bytes):
+            return False
+        if large_text_bytes is None:
+            large_text_bytes = self.large_text_bytes
+        # Quoting can make the command much longer than the text itself
+        command = helpers.build_text_broadcast(text)
+        if len(command.encode("utf-8")) > large_text_bytes:
+            command = helpers.build_text_file_broadcast(await self.push_text_file(device, text_bytes))
+        self.expect_write(device, bytes_digest(text_bytes))
+        with metrics.timer("broadcast", device, len(text_bytes)):
+            result = await self.sessions.run(device, command, text=True)
+        output = result.stdout
+        if result.returncode != 0 or "Error" in output or "inaccessible" in output:
+            print(f"[{device}] ADB failed sending text: {output.strip()}")
+            return False
+        print(f"[{device}] Sent text to Android: {text[:30]}..." if len(text) > 30 else f"[{device}] Sent text to Android: {text}")
+        return True
+
+    async def push_text_file(self, device, text_bytes, push_path=helpers.TEXT_PUSH_PATH):
+        """Streams text gzipped into a device file; chunks are compressed off the loop as the pipe drains."""
+        metrics.count("subprocesses.adb", device=device)
+        chunks = helpers.iter_compressed_text(text_bytes)
+        pushed = 0
+        with metrics.timer("adb_push_text", device, len(text_bytes)):
+            process = await asyncio.create_subprocess_exec(
+                *helpers.image_push_command(device, push_path),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                    if chunk is None:
+                        break
+                    process.stdin.write(chunk)
+                    pushed += len(chunk)
+                    await process.stdin.drain()
+                process.stdin.close()
+                returncode = await process.wait()
+            except BaseException:
+                process.kill()
+                raise
+        if returncode != 0:
+            raise RuntimeError(f"adb exec-in exited with {returncode}")
+        metrics.count("text_compressed_bytes", n=pushed, device=device)
+        return push_path
+
+    async def send_image(self, device, digest, encode):
+        if helpers.IMAGE_TRANSFER_MODE == "binary" and await self.install_cached_blob(device, digest):
+            print(f"[{device}] Sent image to Android (cached on device)")
+            return True
+
+        encoded = await encode()
+        if encoded is None:
+            return False
+        plan, img_bytes = encoded
+
+        keep_blob = helpers.IMAGE_TRANSFER_MODE == "binary"
+        if keep_blob:
+            push_path = helpers.blob_path(img_bytes)
+            await self.push_image_binary(device, img_bytes, plan.mime_type, plan.filename, push_path)
+            self.expect_write(device, helpers.blob_digest(push_path))
+            extra = "image_bin"
+        else:
+            start = time.perf_counter()
+            push_path = await asyncio.to_thread(helpers.push_image_base64, device, img_bytes, plan, digest)
+            self.link_throughput.record(device, len(img_bytes), time.perf_counter() - start)
+            self.expect_write(device, bytes_digest(img_bytes))
+            extra = "image_file"
+
+        with metrics.timer("broadcast", device):
+            result = await self.sessions.run(device, helpers.build_image_broadcast(extra, push_path, keep_blob), text=True)
+        if result.returncode != 0:
+            print(f"[{device}] Failed to send image broadcast: {result.stdout}")
+            return False
+        if keep_blob:
+            self.device_blobs.add(device, digest, push_path, len(img_bytes))
+        print(f"[{device}] Sent image to Android ({len(img_bytes)} bytes, {plan.format})")
+        return True
+
+    async def install_cached_blob(self, device, digest):
+        """Re-installs an image the device already holds; False if it has no blob for it."""
+        push_path = self.device_blobs.lookup(device, digest)
+        if push_path is None:
+            return False
+        self.expect_write(device, helpers.blob_digest(push_path))
+        with metrics.timer("broadcast", device):
+            result = await self.sessions.run(device, helpers.build_blob_install_command(push_path), text=True)
+        if result.returncode != 0 or helpers.BLOB_MISS_MARKER in result.stdout:
+            # Evicted on the device (or app data cleared); fall back to a full push
+            self.device_blobs.discard(device, digest)
+            metrics.count("blob_cache_misses", device=device)
+            return False
+        metrics.count("blob_cache_hits", device=device)
+        return True
+
+    async def push_image_binary(self, device, img_bytes, mime_type, filename, push_path=None):
+        push_path = push_path or f"{helpers.DEVICE_FILES_DIR}/clipboard_image_from_mac.bin"
+        metrics.count("subprocesses.adb", device=device)
+        start = time.perf_counter()
+        with metrics.timer("adb_push", device, len(img_bytes)):
+            process = await asyncio.create_subprocess_exec(
+                *helpers.image_push_command(device, push_path),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                process.stdin.write(helpers.build_image_header(mime_type, filename, len(img_bytes)))
+                process.stdin.write(img_bytes)
+                await process.stdin.drain()
+                process.stdin.close()
+                returncode = await process.wait()
+            except BaseException:
+                process.kill()
+                raise
+        if returncode != 0:
+            raise RuntimeError(f"adb exec-in exited with {returncode}")
+        self.link_throughput.record(device, len(img_bytes), time.perf_counter() - start)
+        return push_path
+
+    # --- Device to host ---
+
+    async def read_clipboard(self, device, wait_timeout=5):
+        with metrics.timer("device_read", device) as timer:
+            result = await self.sessions.run(device, helpers.build_read_script(wait_timeout), timeout=wait_timeout + 60)
+            timer.add_bytes(len(result.stdout))
+        status, meta, payload = helpers.parse_read_response(result.stdout)
+        clipboard_data = helpers.clipboard_data_from_frame(device, status, meta, payload)
+        if clipboard_data is not None and clipboard_data.get('remote_path'):
+            clipboard_data['path'], clipboard_data['size'], clipboard_data['digest'] = await self.pull_image_file(
+                device, clipboard_data['remote_path']
+            )
+        return clipboard_data
+
+    async def pull_image_file(self, device, remote_path, max_bytes=helpers.MAX_IMAGE_BYTES):
+        """Streams a large device image into a host temp file one chunk at a time; returns (path, size, digest)."""
+        digest = BytesDigest()
+        size = 0
+        metrics.count("subprocesses.adb", device=device)
+        out = helpers.new_pull_file()
+        try:
+            with metrics.timer("adb_pull", device) as timer:
+                process = await asyncio.create_subprocess_exec(
+                    *helpers.image_pull_command(device, remote_path),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                try:
+                    while True:
+                        chunk = await process.stdout.read(helpers.PULL_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise ValueError(f"image larger than {max_bytes} bytes")
+                        out.write(chunk)
+                        digest.update(chunk)
+                    returncode = await process.wait()
+                except BaseException:
+                    process.kill()
+                    raise
+                timer.add_bytes(size)
+            out.close()
+            if returncode != 0 or size == 0:
+                raise RuntimeError(f"adb exec-out exited with {returncode} after {size} bytes")
+            return out.name, size, digest.hexdigest()
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
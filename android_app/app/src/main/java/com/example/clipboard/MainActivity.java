@@ -25,6 +25,7 @@ public class MainActivity extends Activity {
     private static final String TEXT_FILENAME = "clipboard_content.txt";
     private static final String IMAGE_META_FILENAME = "clipboard_image_meta.txt";
     private static final String IMAGE_DATA_FILENAME = "clipboard_image.bin";
+    private static final String READY_FILENAME = "clipboard_ready.txt";
     private boolean hasProcessed = false;
 
     @Override
@@ -38,21 +39,23 @@ public class MainActivity extends Activity {
         super.onWindowFocusChanged(hasFocus);
         if (hasFocus && !hasProcessed) {
             hasProcessed = true;
-            readClipboardAndWriteToFile();
+            String kind = readClipboardAndWriteToFile();
+            // Written last so the host can stop waiting as soon as the data is complete
+            writeReadyMarker(kind);
             finish();
         }
     }
 
-    private void readClipboardAndWriteToFile() {
+    private String readClipboardAndWriteToFile() {
         ClipboardManager clipboard = (ClipboardManager) getSystemService(Context.CLIPBOARD_SERVICE);
         if (clipboard == null) {
             Log.e(TAG, "ClipboardManager is null");
-            return;
+            return "empty";
         }
 
         if (!clipboard.hasPrimaryClip()) {
             Log.i(TAG, "No primary clip");
-            return;
+            return "empty";
         }
 
         ClipData clip = clipboard.getPrimaryClip();
@@ -63,8 +66,7 @@ public class MainActivity extends Activity {
             Uri uri = item.getUri();
             if (uri != null) {
                 Log.i(TAG, "Clipboard contains URI: " + uri);
-                handleImageUri(uri);
-                return;
+                return handleImageUri(uri) ? "image" : "empty";
             }
             
             // Check for text
@@ -73,14 +75,15 @@ public class MainActivity extends Activity {
                 String clipboardText = text.toString();
                 Log.i(TAG, "Clipboard text found: " + clipboardText);
                 writeTextToFile(clipboardText);
-                return;
+                return "text";
             }
             
             Log.i(TAG, "Clipboard item has no text or URI");
         }
+        return "empty";
     }
 
-    private void handleImageUri(Uri uri) {
+    private boolean handleImageUri(Uri uri) {
         try {
             ContentResolver resolver = getContentResolver();
             String mimeType = resolver.getType(uri);
@@ -88,7 +91,7 @@ public class MainActivity extends Activity {
             // Check if it's an image
             if (mimeType == null || !mimeType.startsWith("image/")) {
                 Log.w(TAG, "URI is not an image, MIME type: " + mimeType);
-                return;
+                return false;
             }
             
             // Get filename if available
@@ -98,7 +101,7 @@ public class MainActivity extends Activity {
             InputStream inputStream = resolver.openInputStream(uri);
             if (inputStream == null) {
                 Log.e(TAG, "Failed to open input stream for URI");
-                return;
+                return false;
             }
             
             File dataFile = new File(getExternalFilesDir(null), IMAGE_DATA_FILENAME);
@@ -117,12 +120,14 @@ public class MainActivity extends Activity {
             writeMetaToFile(metaData);
             
             Log.i(TAG, "Successfully processed image: " + mimeType + ", saved to " + dataFile.getAbsolutePath());
+            return true;
             
         } catch (IOException e) {
             Log.e(TAG, "Error reading image from URI", e);
         } catch (SecurityException e) {
             Log.e(TAG, "Permission denied reading URI", e);
         }
+        return false;
     }
     
     private String getFileName(Uri uri) {
@@ -159,6 +164,15 @@ public class MainActivity extends Activity {
         }
     }
     
+    private void writeReadyMarker(String kind) {
+        File file = new File(getExternalFilesDir(null), READY_FILENAME);
+        try (FileOutputStream fos = new FileOutputStream(file)) {
+            fos.write(kind.getBytes(StandardCharsets.UTF_8));
+        } catch (IOException e) {
+            Log.e(TAG, "Error writing ready marker", e);
+        }
+    }
+    
     private void writeMetaToFile(String data) {
         File file = new File(getExternalFilesDir(null), IMAGE_META_FILENAME);
         try (FileOutputStream fos = new FileOutputStream(file)) {
@@ -0,0 +1,362 @@
+package com.example.clipboard;
+
+import android.app.Notification;
+import android.app.NotificationChannel;
+import android.app.NotificationManager;
+import android.app.Service;
+import android.content.ClipData;
+import android.content.ClipboardManager;
+import android.content.ContentResolver;
+import android.content.Context;
+import android.content.Intent;
+import android.content.pm.ServiceInfo;
+import android.net.Uri;
+import android.os.Build;
+import android.os.IBinder;
+import android.util.Log;
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.File;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.net.InetAddress;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.nio.charset.StandardCharsets;
+import java.security.MessageDigest;
+import java.util.Arrays;
+import java.util.List;
+import java.util.concurrent.CopyOnWriteArrayList;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+
+/**
+ * Clipboard transfers over a framed TCP stream, for the host's socket transport.
+ *
+ * Listens on loopback (reached from the host through `adb forward`) and
+ * speaks the frames defined in socket_transport.py: HELLO, TEXT, IMAGE and
+ * ACK. A connection is only served after its HELLO carries the token the
+ * host passed in the start intent; anything else is dropped, so other apps
+ * on the device cannot use the port to read or write the clipboard. Writes
+ * are acknowledged with the digest of the stored content.
+ * Clipboard changes this service can see are pushed to connected hosts;
+ * since Android 10 that is only while the app is in the foreground, so the
+ * host keeps its logcat-triggered reads as well.
+ */
+public class SocketSyncService extends Service {
+    private static final String TAG = "ClipboardSocketService";
+    private static final String CHANNEL_ID = "clipboard_sync";
+    // Must match DEVICE_PORT and the frame constants in socket_transport.py
+    static final int PORT = 47821;
+    private static final byte[] FRAME_MAGIC = {'C', 'S', 'F', '1'};
+    private static final byte KIND_HELLO = 'H';
+    private static final byte KIND_TEXT = 'T';
+    private static final byte KIND_IMAGE = 'I';
+    private static final byte KIND_ACK = 'A';
+    private static final int MAX_META_BYTES = 64 * 1024;
+    private static final long MAX_PAYLOAD_BYTES = 50L * 1024 * 1024;
+    static final String EXTRA_TOKEN = "token";
+
+    private ServerSocket serverSocket;
+    private ClipboardManager clipboard;
+    private final List<DataOutputStream> hosts = new CopyOnWriteArrayList<>();
+    private final ExecutorService pushExecutor = Executors.newSingleThreadExecutor();
+    // Digest of the last content written for the host, so it is not pushed back
+    private volatile String lastWrittenDigest;
+    // Secret from the host's start intent; null (reject everyone) until one arrives
+    private volatile byte[] token;
+
+    private final ClipboardManager.OnPrimaryClipChangedListener clipListener =
+        () -> pushExecutor.execute(this::pushClipboard);
+
+    @Override
+    public void onCreate() {
+        super.onCreate();
+        clipboard = (ClipboardManager) getSystemService(Context.CLIPBOARD_SERVICE);
+        if (clipboard != null) {
+            clipboard.addPrimaryClipChangedListener(clipListener);
+        }
+    }
+
+    @Override
+    public int onStartCommand(Intent intent, int flags, int startId) {
+        startForegroundNotification();
+        String newToken = intent != null ? intent.getStringExtra(EXTRA_TOKEN) : null;
+        if (newToken != null && !newToken.isEmpty()) {
+            byte[] bytes = newToken.getBytes(StandardCharsets.US_ASCII);
+            if (token == null || !MessageDigest.isEqual(token, bytes)) {
+                token = bytes;
+                // Hosts authenticated with the old token are no longer trusted
+                for (DataOutputStream out : hosts) {
+                    closeQuietly(out);
+                }
+                hosts.clear();
+            }
+        }
+        if (serverSocket == null) {
+            try {
+                serverSocket = new ServerSocket(PORT, 4, InetAddress.getByName("127.0.0.1"));
+                new Thread(this::acceptLoop, "clipboard-socket-accept").start();
+                Log.i(TAG, "Listening on 127.0.0.1:" + PORT);
+            } catch (IOException e) {
+                Log.e(TAG, "Could not listen on port " + PORT, e);
+                stopSelf();
+            }
+        }
+        return START_STICKY;
+    }
+
+    @Override
+    public void onDestroy() {
+        if (clipboard != null) {
+            clipboard.removePrimaryClipChangedListener(clipListener);
+        }
+        pushExecutor.shutdownNow();
+        if (serverSocket != null) {
+            try {
+                serverSocket.close();
+            } catch (IOException e) {
+                Log.w(TAG, "Error closing server socket", e);
+            }
+        }
+        super.onDestroy();
+    }
+
+    @Override
+    public IBinder onBind(Intent intent) {
+        return null;
+    }
+
+    private void startForegroundNotification() {
+        Notification.Builder builder;
+        if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.O) {
+            NotificationManager manager = getSystemService(NotificationManager.class);
+            manager.createNotificationChannel(
+                new NotificationChannel(CHANNEL_ID, "Clipboard sync", NotificationManager.IMPORTANCE_MIN));
+            builder = new Notification.Builder(this, CHANNEL_ID);
+        } else {
+            builder = new Notification.Builder(this);
+        }
+        Notification notification = builder
+            .setContentTitle("Clipboard sync connected")
+            .setSmallIcon(android.R.drawable.ic_menu_share)
+            .build();
+        if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.Q) {
+            startForeground(1, notification, ServiceInfo.FOREGROUND_SERVICE_TYPE_DATA_SYNC);
+        } else {
+            startForeground(1, notification);
+        }
+    }
+
+    private void acceptLoop() {
+        while (!serverSocket.isClosed()) {
+            try {
+                Socket socket = serverSocket.accept();
+                new Thread(() -> serve(socket), "clipboard-socket-host").start();
+            } catch (IOException e) {
+                if (!serverSocket.isClosed()) {
+                    Log.e(TAG, "Error accepting connection", e);
+                }
+            }
+        }
+    }
+
+    private void serve(Socket socket) {
+        DataOutputStream out = null;
+        boolean authenticated = false;
+        try {
+            socket.setTcpNoDelay(true);
+            DataInputStream in = new DataInputStream(new BufferedInputStream(socket.getInputStream()));
+            out = new DataOutputStream(new BufferedOutputStream(socket.getOutputStream()));
+            while (true) {
+                byte[] magic = new byte[FRAME_MAGIC.length];
+                in.readFully(magic);
+                if (!Arrays.equals(magic, FRAME_MAGIC)) {
+                    Log.e(TAG, "Bad frame magic, closing connection");
+                    break;
+                }
+                byte kind = in.readByte();
+                int metaLength = in.readInt();
+                long payloadLength = in.readLong();
+                if (metaLength < 0 || metaLength > MAX_META_BYTES
+                        || payloadLength < 0 || payloadLength > MAX_PAYLOAD_BYTES) {
+                    Log.e(TAG, "Frame too large, closing connection");
+                    break;
+                }
+                byte[] meta = new byte[metaLength];
+                in.readFully(meta);
+
+                if (kind == KIND_HELLO) {
+                    byte[] expected = token;
+                    if (expected == null || !MessageDigest.isEqual(expected, meta)) {
+                        Log.w(TAG, "Rejected connection with a wrong or missing token");
+                        break;
+                    }
+                    authenticated = true;
+                    in.skipBytes((int) payloadLength);
+                    writeFrame(out, KIND_HELLO, new byte[0], new byte[0]);
+                    hosts.add(out);
+                } else if (!authenticated) {
+                    Log.w(TAG, "Frame before authentication, closing connection");
+                    break;
+                } else if (kind == KIND_TEXT) {
+                    byte[] payload = new byte[(int) payloadLength];
+                    in.readFully(payload);
+                    String digest = WriteReceiver.handleTextWrite(this, new String(payload, StandardCharsets.UTF_8));
+                    lastWrittenDigest = digest;
+                    writeAck(out, digest);
+                } else if (kind == KIND_IMAGE) {
+                    String digest = receiveImage(in, new String(meta, StandardCharsets.UTF_8), payloadLength);
+                    lastWrittenDigest = digest;
+                    writeAck(out, digest);
+                } else {
+                    in.skipBytes((int) payloadLength);
+                }
+            }
+        } catch (IOException e) {
+            Log.i(TAG, "Host disconnected: " + e.getMessage());
+        } finally {
+            if (out != null) {
+                hosts.remove(out);
+            }
+            try {
+                socket.close();
+            } catch (IOException ignored) {
+            }
+        }
+    }
+
+    private String receiveImage(DataInputStream in, String meta, long length) throws IOException {
+        String mimeType = meta.split("\n", 2)[0];
+        File imageFile = WriteReceiver.createCacheImageFile(this, mimeType);
+        MessageDigest digest = WriteReceiver.newContentDigest();
+        // Always consume the whole payload so the stream stays framed
+        byte[] buffer = new byte[64 * 1024];
+        long remaining = length;
+        try (FileOutputStream fos = new FileOutputStream(imageFile)) {
+            while (remaining > 0) {
+                int len = in.read(buffer, 0, (int) Math.min(buffer.length, remaining));
+                if (len == -1) {
+                    throw new IOException("Stream ended " + remaining + " bytes short");
+                }
+                fos.write(buffer, 0, len);
+                digest.update(buffer, 0, len);
+                remaining -= len;
+            }
+        }
+        try {
+            WriteReceiver.publishImageFile(this, imageFile);
+        } catch (Exception e) {
+            Log.e(TAG, "Error writing image to clipboard", e);
+            return null;
+        }
+        return WriteReceiver.logClipboardChanged(digest);
+    }
+
+    private static void closeQuietly(DataOutputStream out) {
+        try {
+            out.close();
+        } catch (IOException ignored) {
+        }
+    }
+
+    private void writeAck(DataOutputStream out, String digest) throws IOException {
+        // An empty digest tells the host the write failed
+        byte[] meta = digest != null ? digest.getBytes(StandardCharsets.US_ASCII) : new byte[0];
+        writeFrame(out, KIND_ACK, meta, new byte[0]);
+    }
+
+    private static void writeFrame(DataOutputStream out, byte kind, byte[] meta, byte[] payload) throws IOException {
+        // Acks from the host threads and pushes from the executor share the stream
+        synchronized (out) {
+            out.write(FRAME_MAGIC);
+            out.writeByte(kind);
+            out.writeInt(meta.length);
+            out.writeLong(payload.length);
+            out.write(meta);
+            out.write(payload);
+            out.flush();
+        }
+    }
+
+    private void pushClipboard() {
+        if (hosts.isEmpty() || clipboard == null) {
+            return;
+        }
+        ClipData clip;
+        try {
+            clip = clipboard.getPrimaryClip();
+        } catch (SecurityException e) {
+            clip = null;
+        }
+        if (clip == null || clip.getItemCount() == 0) {
+            // Not readable from the background; the host's logcat read covers it
+            return;
+        }
+        ClipData.Item item = clip.getItemAt(0);
+        try {
+            byte kind;
+            byte[] meta;
+            byte[] payload;
+            Uri uri = item.getUri();
+            if (uri != null) {
+                ContentResolver resolver = getContentResolver();
+                String mimeType = resolver.getType(uri);
+                if (mimeType == null || !mimeType.startsWith("image/")) {
+                    return;
+                }
+                payload = readUri(resolver, uri);
+                if (payload == null) {
+                    return;
+                }
+                kind = KIND_IMAGE;
+                meta = (mimeType + "\n" + uri.getLastPathSegment()).getBytes(StandardCharsets.UTF_8);
+            } else if (item.getText() != null) {
+                kind = KIND_TEXT;
+                meta = new byte[0];
+                payload = item.getText().toString().getBytes(StandardCharsets.UTF_8);
+            } else {
+                return;
+            }
+
+            MessageDigest digest = WriteReceiver.newContentDigest();
+            digest.update(payload);
+            if (WriteReceiver.digestHex(digest).equals(lastWrittenDigest)) {
+                // Our own write for the host
+                return;
+            }
+            for (DataOutputStream out : hosts) {
+                try {
+                    writeFrame(out, kind, meta, payload);
+                } catch (IOException e) {
+                    hosts.remove(out);
+                }
+            }
+            Log.i(TAG, "Pushed clipboard change to " + hosts.size() + " host(s)");
+        } catch (IOException | SecurityException e) {
+            Log.e(TAG, "Error pushing clipboard change", e);
+        }
+    }
+
+    private static byte[] readUri(ContentResolver resolver, Uri uri) throws IOException {
+        try (InputStream in = resolver.openInputStream(uri)) {
+            if (in == null) {
+                return null;
+            }
+            ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+            byte[] buffer = new byte[64 * 1024];
+            int len;
+            while ((len = in.read(buffer)) != -1) {
+                bytes.write(buffer, 0, len);
+                if (bytes.size() > MAX_PAYLOAD_BYTES) {
+                    return null;
+                }
+            }
+            return bytes.toByteArray();
+        }
+    }
+}
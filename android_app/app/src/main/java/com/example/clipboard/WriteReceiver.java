@@ -9,20 +9,49 @@ import android.net.Uri;
 import android.util.Base64;
 import android.util.Log;
 import androidx.core.content.FileProvider;
+import java.io.BufferedInputStream;
 import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.EOFException;
 import java.io.File;
+import java.io.FileInputStream;
 import java.io.FileOutputStream;
 import java.io.FileReader;
 import java.io.IOException;
+import java.io.InputStream;
+import java.nio.charset.StandardCharsets;
+import java.security.MessageDigest;
+import java.security.NoSuchAlgorithmException;
+import java.util.Arrays;
+import java.util.zip.GZIPInputStream;
 
 public class WriteReceiver extends BroadcastReceiver {
     private static final String TAG = "ClipboardWriteReceiver";
+    // Matched by the host's logcat filter; the digest lets it drop its own writes as echoes
+    private static final String MONITOR_TAG = "ClipboardMonitor";
+    private static final byte[] IMAGE_HEADER_MAGIC = {'C', 'S', 'B', '1'};
+    // Pushed images kept for re-use; must match MAX_BLOBS / MAX_BLOB_BYTES on the host
+    private static final int BLOB_CACHE_MAX_FILES = 16;
+    private static final long BLOB_CACHE_MAX_BYTES = 256L * 1024 * 1024;
+    // setPrimaryClip passes the text in one binder transaction (1 MB, UTF-16);
+    // matches MAX_CLIPBOARD_TEXT_BYTES on the host
+    private static final int MAX_TEXT_BYTES = 256 * 1024;
 
     @Override
     public void onReceive(Context context, Intent intent) {
         if (intent != null && "com.example.clipboard.WRITE".equals(intent.getAction())) {
             
-            // Check for image file path (new method)
+            // Check for binary image file path (raw bytes with a small header)
+            String binaryImagePath = intent.getStringExtra("image_bin");
+            if (binaryImagePath != null) {
+                Log.d(TAG, "Received binary image file path: " + binaryImagePath);
+                boolean keepBlob = intent.getBooleanExtra("keep_blob", false);
+                handleBinaryImageFromFile(context, binaryImagePath, keepBlob);
+                return;
+            }
+            
+            // Check for Base64 image file path
             String imageFilePath = intent.getStringExtra("image_file");
             if (imageFilePath != null) {
                 Log.d(TAG, "Received image file path: " + imageFilePath);
@@ -40,10 +69,18 @@ public class WriteReceiver extends BroadcastReceiver {
                 return;
             }
             
+            // Check for a gzip text file (large texts)
+            String textFilePath = intent.getStringExtra("text_gz");
+            if (textFilePath != null) {
+                Log.d(TAG, "Received compressed text file path: " + textFilePath);
+                handleCompressedTextFromFile(context, textFilePath);
+                return;
+            }
+            
             // Check for text data
             String text = intent.getStringExtra("text");
             if (text != null) {
-                Log.d(TAG, "Received text to write: " + text);
+                Log.d(TAG, "Received text to write (" + text.length() + " chars)");
                 handleTextWrite(context, text);
                 return;
             }
@@ -52,6 +89,81 @@ public class WriteReceiver extends BroadcastReceiver {
         }
     }
     
+    private void handleBinaryImageFromFile(Context context, String filePath, boolean keepBlob) {
+        File sourceFile = new File(filePath);
+        if (!sourceFile.exists()) {
+            Log.e(TAG, "Image file does not exist: " + filePath);
+            return;
+        }
+        
+        try (DataInputStream in = new DataInputStream(new BufferedInputStream(new FileInputStream(sourceFile)))) {
+            // Header: magic, MIME type, filename, payload length
+            byte[] magic = new byte[IMAGE_HEADER_MAGIC.length];
+            in.readFully(magic);
+            if (!Arrays.equals(magic, IMAGE_HEADER_MAGIC)) {
+                Log.e(TAG, "Unknown binary image header");
+                return;
+            }
+            String mimeType = in.readUTF();
+            in.readUTF(); // filename, unused
+            long remaining = in.readLong();
+            
+            Log.i(TAG, "Read binary image header: " + mimeType + ", payload length: " + remaining);
+            
+            // Stream the payload straight into the cache file, no decoding needed
+            File imageFile = createCacheImageFile(context, mimeType);
+            MessageDigest digest = newContentDigest();
+            try (FileOutputStream fos = new FileOutputStream(imageFile)) {
+                byte[] buffer = new byte[65536];
+                while (remaining > 0) {
+                    int len = in.read(buffer, 0, (int) Math.min(buffer.length, remaining));
+                    if (len == -1) {
+                        throw new EOFException("Image payload truncated, " + remaining + " bytes missing");
+                    }
+                    fos.write(buffer, 0, len);
+                    digest.update(buffer, 0, len);
+                    remaining -= len;
+                }
+                fos.flush();
+            }
+            
+            publishImageFile(context, imageFile);
+            logClipboardChanged(digest);
+            
+        } catch (IOException e) {
+            Log.e(TAG, "Error reading binary image file", e);
+        } catch (Exception e) {
+            Log.e(TAG, "Error writing image to clipboard", e);
+        } finally {
+            if (keepBlob) {
+                // Keep it in the blob cache; the host re-installs it by path next time
+                sourceFile.setLastModified(System.currentTimeMillis());
+                trimBlobCache(sourceFile);
+            } else if (sourceFile.delete()) {
+                Log.d(TAG, "Deleted temp image file");
+            }
+        }
+    }
+    
+    private void trimBlobCache(File keep) {
+        File[] files = keep.getParentFile() != null ? keep.getParentFile().listFiles() : null;
+        if (files == null) {
+            return;
+        }
+        // Most recently used first; evict from the tail until both limits hold
+        Arrays.sort(files, (f1, f2) -> Long.compare(f2.lastModified(), f1.lastModified()));
+        long totalBytes = 0;
+        int kept = 0;
+        for (File file : files) {
+            if (file.equals(keep) || (kept < BLOB_CACHE_MAX_FILES && totalBytes + file.length() <= BLOB_CACHE_MAX_BYTES)) {
+                totalBytes += file.length();
+                kept++;
+            } else if (file.delete()) {
+                Log.d(TAG, "Evicted cached blob " + file.getName());
+            }
+        }
+    }
+    
     private void handleImageFromFile(Context context, String filePath) {
         BufferedReader reader = null;
         try {
@@ -103,17 +215,48 @@ public class WriteReceiver extends BroadcastReceiver {
         }
     }
     
-    private void handleTextWrite(Context context, String text) {
+    private void handleCompressedTextFromFile(Context context, String filePath) {
+        File textFile = new File(filePath);
+        if (!textFile.exists()) {
+            Log.e(TAG, "Text file does not exist: " + filePath);
+            return;
+        }
+        
+        try (InputStream in = new GZIPInputStream(new FileInputStream(textFile), 64 * 1024)) {
+            ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+            byte[] buffer = new byte[64 * 1024];
+            int len;
+            while ((len = in.read(buffer)) != -1) {
+                bytes.write(buffer, 0, len);
+                if (bytes.size() > MAX_TEXT_BYTES) {
+                    Log.e(TAG, "Text larger than " + MAX_TEXT_BYTES + " bytes, not written");
+                    return;
+                }
+            }
+            Log.i(TAG, "Decompressed text: " + textFile.length() + " -> " + bytes.size() + " bytes");
+            handleTextWrite(context, new String(bytes.toByteArray(), StandardCharsets.UTF_8));
+        } catch (IOException e) {
+            Log.e(TAG, "Error reading compressed text file", e);
+        } finally {
+            textFile.delete();
+        }
+    }
+    
+    static String handleTextWrite(Context context, String text) {
         try {
             ClipboardManager clipboard = (ClipboardManager) context.getSystemService(Context.CLIPBOARD_SERVICE);
             if (clipboard != null) {
                 ClipData clip = ClipData.newPlainText("ADB", text);
                 clipboard.setPrimaryClip(clip);
                 Log.i(TAG, "Text written to clipboard");
+                MessageDigest digest = newContentDigest();
+                digest.update(text.getBytes(StandardCharsets.UTF_8));
+                return logClipboardChanged(digest);
             }
         } catch (Exception e) {
             Log.e(TAG, "Error writing text to clipboard", e);
         }
+        return null;
     }
     
     private void handleImageWrite(Context context, String base64Data, String mimeType) {
@@ -123,19 +266,7 @@ public class WriteReceiver extends BroadcastReceiver {
             
             Log.i(TAG, "Decoded image: " + imageBytes.length + " bytes");
             
-            // Determine file extension from MIME type
-            String extension = getExtensionFromMimeType(mimeType);
-            
-            // Create temporary file in cache directory
-            File cacheDir = new File(context.getCacheDir(), "clipboard_images");
-            if (!cacheDir.exists()) {
-                cacheDir.mkdirs();
-            }
-            
-            // Clean old files (keep cache small)
-            cleanOldFiles(cacheDir);
-            
-            File imageFile = new File(cacheDir, "clipboard_image_" + System.currentTimeMillis() + extension);
+            File imageFile = createCacheImageFile(context, mimeType);
             
             // Write decoded data to file
             try (FileOutputStream fos = new FileOutputStream(imageFile)) {
@@ -143,24 +274,10 @@ public class WriteReceiver extends BroadcastReceiver {
                 fos.flush();
             }
             
-            Log.i(TAG, "Image written to temp file: " + imageFile.getAbsolutePath());
-            
-            // Create content URI using FileProvider
-            Uri contentUri = FileProvider.getUriForFile(
-                context,
-                "com.example.clipboard.fileprovider",
-                imageFile
-            );
-            
-            Log.i(TAG, "Created content URI: " + contentUri);
-            
-            // Write URI to clipboard
-            ClipboardManager clipboard = (ClipboardManager) context.getSystemService(Context.CLIPBOARD_SERVICE);
-            if (clipboard != null) {
-                ClipData clip = ClipData.newUri(context.getContentResolver(), "ADB Image", contentUri);
-                clipboard.setPrimaryClip(clip);
-                Log.i(TAG, "Image URI written to clipboard");
-            }
+            publishImageFile(context, imageFile);
+            MessageDigest digest = newContentDigest();
+            digest.update(imageBytes);
+            logClipboardChanged(digest);
             
         } catch (IllegalArgumentException e) {
             Log.e(TAG, "Invalid Base64 data", e);
@@ -171,7 +288,68 @@ public class WriteReceiver extends BroadcastReceiver {
         }
     }
     
-    private String getExtensionFromMimeType(String mimeType) {
+    static File createCacheImageFile(Context context, String mimeType) {
+        // Determine file extension from MIME type
+        String extension = getExtensionFromMimeType(mimeType);
+        
+        // Create temporary file in cache directory
+        File cacheDir = new File(context.getCacheDir(), "clipboard_images");
+        if (!cacheDir.exists()) {
+            cacheDir.mkdirs();
+        }
+        
+        // Clean old files (keep cache small)
+        cleanOldFiles(cacheDir);
+        
+        return new File(cacheDir, "clipboard_image_" + System.currentTimeMillis() + extension);
+    }
+    
+    static void publishImageFile(Context context, File imageFile) {
+        Log.i(TAG, "Image written to temp file: " + imageFile.getAbsolutePath());
+        
+        // Create content URI using FileProvider
+        Uri contentUri = FileProvider.getUriForFile(
+            context,
+            "com.example.clipboard.fileprovider",
+            imageFile
+        );
+        
+        Log.i(TAG, "Created content URI: " + contentUri);
+        
+        // Write URI to clipboard
+        ClipboardManager clipboard = (ClipboardManager) context.getSystemService(Context.CLIPBOARD_SERVICE);
+        if (clipboard != null) {
+            ClipData clip = ClipData.newUri(context.getContentResolver(), "ADB Image", contentUri);
+            clipboard.setPrimaryClip(clip);
+            Log.i(TAG, "Image URI written to clipboard");
+        }
+    }
+    
+    static MessageDigest newContentDigest() {
+        try {
+            return MessageDigest.getInstance("SHA-256");
+        } catch (NoSuchAlgorithmException e) {
+            throw new IllegalStateException("SHA-256 not available", e);
+        }
+    }
+    
+    static String logClipboardChanged(MessageDigest digest) {
+        String hex = digestHex(digest);
+        Log.i(MONITOR_TAG, "Clipboard changed: written by host digest=" + hex);
+        return hex;
+    }
+    
+    static String digestHex(MessageDigest digest) {
+        // Truncated to 16 bytes, as computed by bytes_digest() on the host
+        byte[] hash = digest.digest();
+        StringBuilder hex = new StringBuilder();
+        for (int i = 0; i < 16; i++) {
+            hex.append(String.format("%02x", hash[i]));
+        }
+        return hex.toString();
+    }
+    
+    private static String getExtensionFromMimeType(String mimeType) {
         switch (mimeType) {
             case "image/jpeg":
             case "image/jpg":
@@ -187,7 +365,7 @@ public class WriteReceiver extends BroadcastReceiver {
         }
     }
     
-    private void cleanOldFiles(File directory) {
+    private static void cleanOldFiles(File directory) {
         File[] files = directory.listFiles();
         if (files != null && files.length > 5) {
             // Keep only the 5 most recent files
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+
+def artifact_size(value):
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    return 0
+
+
+class ArtifactCache:
+    """Content-keyed cache of encoded forms of recent clipboard items.
+
+    Entries are keyed by content digest and hold named artifacts (PNG bytes,
+    transfer payloads, fingerprints, ...). Each artifact is produced at most
+    once per key, even when several threads ask for it at the same time.
+    Whole entries are evicted least-recently-used first once there are more
+    than max_items or the artifacts add up to more than max_bytes.
+    """
+
+    def __init__(self, max_items=8, max_bytes=128 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.building = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, kind):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or kind not in entry:
+                return None
+            self.entries.move_to_end(key)
+            return entry[kind]
+
+    def put(self, key, kind, value):
+        with self.lock:
+            self._store(key, kind, value)
+        return value
+
+    def get_or_create(self, key, kind, factory):
+        """Returns the cached artifact, calling factory() to build it on a miss."""
+        if key is None:
+            return factory()
+
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and kind in entry:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[kind]
+                pending = self.building.get((key, kind))
+                if pending is None:
+                    pending = self.building[(key, kind)] = threading.Event()
+                    self.misses += 1
+                    break
+            # Someone else is building it; wait and look again
+            pending.wait()
+
+        try:
+            value = factory()
+            with self.lock:
+                self._store(key, kind, value)
+            return value
+        finally:
+            with self.lock:
+                self.building.pop((key, kind)).set()
+
+    def _store(self, key, kind, value):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {}
+        self.total_bytes -= artifact_size(entry.get(kind))
+        entry[kind] = value
+        self.total_bytes += artifact_size(value)
+        self.entries.move_to_end(key)
+        self._evict(keep=key)
+
+    def _evict(self, keep):
+        while len(self.entries) > self.max_items or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            if oldest == keep:
+                # Never drop the item being stored, even if it alone exceeds max_bytes
+                break
+            entry = self.entries.pop(oldest)
+            self.total_bytes -= sum(artifact_size(value) for value in entry.values())
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "items": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
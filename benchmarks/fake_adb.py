@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Scriptable stand-in for `adb` used by the benchmark harness.
+
+Installed on PATH as `adb` (and, for the simulated device shell, as `am`
+and `getprop`) by launchers that pass `--fake-tool <name>`. All state
+lives under $FAKE_ADB_STATE:
+
+    config.json           devices, serials and simulated delays
+    spawns.log            one line per fake adb invocation
+    <device>/root/...     simulated device filesystem ("/sdcard/..." maps here)
+    <device>/clipboard.json  the simulated device clipboard
+    <device>/logcat.txt   lines streamed by `adb logcat`
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import time
+
+STATE_DIR = os.environ.get("FAKE_ADB_STATE", "")
+FILES_DIR = "/sdcard/Android/data/com.example.clipboard/files"
+LOGCAT_LINE = re.compile(r"^\S+ \S+ \w/([^(\s]+)\s*\(")
+
+
+def load_config():
+    with open(os.path.join(STATE_DIR, "config.json")) as f:
+        return json.load(f)
+
+
+def device_dir(device):
+    return os.path.join(STATE_DIR, device)
+
+
+def device_root(device):
+    return os.path.join(device_dir(device), "root")
+
+
+def map_paths(device, text):
+    """Rewrites device paths into the simulated filesystem."""
+    return text.replace("/sdcard/", device_root(device) + "/sdcard/")
+
+
+def record_spawn(argv):
+    with open(os.path.join(STATE_DIR, "spawns.log"), "a") as f:
+        f.write(" ".join(argv)[:200].replace("\n", " ") + "\n")
+
+
+def throttle(config, nbytes):
+    rate = config.get("transfer_rate", 0)
+    if rate:
+        time.sleep(nbytes / rate)
+
+
+def read_clipboard(device):
+    try:
+        with open(os.path.join(device_dir(device), "clipboard.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_clipboard(device, clip):
+    path = os.path.join(device_dir(device), "clipboard.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(clip, f)
+    os.replace(path + ".tmp", path)
+
+
+def append_logcat(device, tag, message):
+    stamp = time.strftime("%m-%d %H:%M:%S")
+    with open(os.path.join(device_dir(device), "logcat.txt"), "a") as f:
+        f.write(f"{stamp}.000 I/{tag}( 1234): {message}\n")
+
+
+# --- adb host commands ---
+
+def cmd_devices(config):
+    print("List of devices attached")
+    for device in config["devices"]:
+        print(f"{device}\tdevice")
+
+
+def cmd_track_devices(config):
+    payload = "".join(f"{device}\tdevice\n" for device in config["devices"]).encode()
+    sys.stdout.buffer.write(b"%04x" % len(payload) + payload)
+    sys.stdout.buffer.flush()
+    while True:
+        time.sleep(3600)
+
+
+def shell_env(device):
+    env = dict(os.environ)
+    env["FAKE_ADB_DEVICE"] = device
+    return env
+
+
+def cmd_shell(config, device, args):
+    if args:
+        return subprocess.call(["sh", "-c", map_paths(device, " ".join(args))], env=shell_env(device))
+
+    # Interactive session: pump stdin line by line so paths can be rewritten
+    process = subprocess.Popen(["sh"], stdin=subprocess.PIPE, env=shell_env(device))
+    try:
+        for line in sys.stdin.buffer:
+            process.stdin.write(map_paths(device, line.decode("utf-8", errors="surrogateescape")).encode("utf-8", errors="surrogateescape"))
+            process.stdin.flush()
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+    return process.wait()
+
+
+def cmd_exec_in(config, device, command):
+    data = sys.stdin.buffer.read()
+    throttle(config, len(data))
+    process = subprocess.Popen(["sh", "-c", map_paths(device, command)], stdin=subprocess.PIPE, env=shell_env(device))
+    process.communicate(data)
+    return process.returncode
+
+
+def cmd_exec_out(config, device, command):
+    output = subprocess.run(["sh", "-c", map_paths(device, command)], stdout=subprocess.PIPE, env=shell_env(device)).stdout
+    throttle(config, len(output))
+    sys.stdout.buffer.write(output)
+    return 0
+
+
+def cmd_push(config, device, local, remote):
+    target = map_paths(device, remote)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(local, target)
+    throttle(config, os.path.getsize(local))
+    return 0
+
+
+def cmd_pull(config, device, remote, local):
+    source = map_paths(device, remote)
+    if not os.path.exists(source):
+        print(f"adb: error: remote object '{remote}' does not exist", file=sys.stderr)
+        return 1
+    shutil.copyfile(source, local)
+    throttle(config, os.path.getsize(source))
+    return 0
+
+
+def cmd_logcat(config, device, args):
+    path = os.path.join(device_dir(device), "logcat.txt")
+    if "-c" in args:
+        open(path, "w").close()
+        return 0
+
+    # Filterspecs: "TAG:V" entries plus "*:S" silence every other tag
+    specs = [arg for arg in args if ":" in arg and not arg.startswith("-")]
+    allowed = {spec.split(":")[0] for spec in specs if not spec.startswith("*")}
+    silence_rest = "*:S" in specs
+
+    def emit(line):
+        if silence_rest:
+            match = LOGCAT_LINE.match(line)
+            if not match or match.group(1) not in allowed:
+                return
+        sys.stdout.write(line)
+
+    noise_rate = config.get("logcat_noise_per_sec", 0)
+    noise_interval = 1.0 / noise_rate if noise_rate else None
+    next_noise = time.time()
+    open(path, "a").close()
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if line:
+                emit(line)
+                sys.stdout.flush()
+                continue
+            if noise_interval:
+                now = time.time()
+                while next_noise <= now:
+                    emit(time.strftime("%m-%d %H:%M:%S") + ".000 D/ActivityManager( 1000): noise line for the benchmark\n")
+                    next_noise += noise_interval
+                sys.stdout.flush()
+            time.sleep(0.005)
+
+
+# --- Device-side tools (run inside the simulated shell) ---
+
+def tool_getprop(config, device, args):
+    if args and args[0] == "ro.serialno":
+        print(config["devices"][device].get("serial", device))
+    return 0
+
+
+def tool_am(config, device, args):
+    time.sleep(config.get("am_delay", 0))
+    if args[:1] == ["start"]:
+        # MainActivity writes the clipboard asynchronously after it gains focus
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "__app_write__", device],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env=shell_env(device), start_new_session=True
+        )
+        print("Starting: Intent { cmp=com.example.clipboard/.MainActivity }")
+        return 0
+
+    if args[:1] == ["broadcast"]:
+        extras = {}
+        i = 0
+        while i < len(args):
+            if args[i] in ("-e", "--ez") and i + 2 < len(args):
+                extras[args[i + 1]] = args[i + 2]
+                i += 3
+            else:
+                i += 1
+        receive_broadcast(config, device, extras)
+        print("Broadcasting: Intent { act=com.example.clipboard.WRITE }")
+        print("Broadcast completed: result=0")
+        return 0
+    return 1
+
+
+def receive_broadcast(config, device, extras):
+    """Simulates WriteReceiver."""
+    store = os.path.join(device_dir(device), "clipboard_image.dat")
+    written = None
+    if "text" in extras:
+        write_clipboard(device, {"type": "text", "data": extras["text"]})
+        written = extras["text"].encode("utf-8")
+    elif "text_gz" in extras:
+        with gzip.open(extras["text_gz"], "rb") as f:
+            written = f.read()
+        os.unlink(extras["text_gz"])
+        write_clipboard(device, {"type": "text", "data": written.decode("utf-8")})
+    elif "image_bin" in extras:
+        with open(extras["image_bin"], "rb") as f:
+            assert f.read(4) == b"CSB1"
+            mime = f.read(struct.unpack(">H", f.read(2))[0]).decode()
+            name = f.read(struct.unpack(">H", f.read(2))[0]).decode()
+            length = struct.unpack(">q", f.read(8))[0]
+            written = f.read(length)
+            with open(store, "wb") as out:
+                out.write(written)
+        if extras.get("keep_blob") != "true":
+            os.unlink(extras["image_bin"])
+        write_clipboard(device, {"type": "image", "mime": mime, "name": name, "path": store})
+    elif "image_file" in extras:
+        with open(extras["image_file"]) as f:
+            mime = f.readline().strip()
+            name = f.readline().strip()
+            written = base64.b64decode("".join(line.strip() for line in f))
+        with open(store, "wb") as out:
+            out.write(written)
+        os.unlink(extras["image_file"])
+        write_clipboard(device, {"type": "image", "mime": mime, "name": name, "path": store})
+    if config.get("echo_logcat") and written is not None:
+        # The system copy toast, then the app's line carrying the content digest
+        append_logcat(device, "SemClipboardToastController", "Copy toast is shown")
+        digest = hashlib.sha256(written).hexdigest()[:32]
+        append_logcat(device, "ClipboardMonitor", f"Clipboard changed: written by host digest={digest}")
+
+
+def app_write(config, device):
+    """Simulates MainActivity writing the clipboard to its files directory."""
+    time.sleep(config.get("app_write_delay", 0))
+    files = device_root(device) + FILES_DIR
+    os.makedirs(files, exist_ok=True)
+    clip = read_clipboard(device)
+    kind = "empty"
+    if clip and clip["type"] == "text":
+        with open(os.path.join(files, "clipboard_content.txt"), "w") as f:
+            f.write(clip["data"])
+        kind = "text"
+    elif clip and clip["type"] == "image":
+        shutil.copyfile(clip["path"], os.path.join(files, "clipboard_image.bin"))
+        with open(os.path.join(files, "clipboard_image_meta.txt"), "w") as f:
+            f.write(f"{clip['mime']}\n{clip['name']}")
+        kind = "image"
+    with open(os.path.join(files, "clipboard_ready.txt"), "w") as f:
+        f.write(kind)
+
+
+def main(argv):
+    tool = "adb"
+    if argv[1:2] == ["--fake-tool"]:
+        tool, argv = argv[2], argv[:1] + argv[3:]
+    config = load_config()
+
+    if tool in ("am", "getprop"):
+        device = os.environ["FAKE_ADB_DEVICE"]
+        handler = tool_am if tool == "am" else tool_getprop
+        return handler(config, device, argv[1:])
+
+    if argv[1:2] == ["__app_write__"]:
+        return app_write(config, argv[2])
+
+    record_spawn(argv[1:])
+    time.sleep(config.get("spawn_delay", 0))
+
+    args = argv[1:]
+    device = None
+    if args[:1] == ["-s"]:
+        device, args = args[1], args[2:]
+    elif len(config["devices"]) == 1:
+        device = next(iter(config["devices"]))
+
+    if not args:
+        return 1
+    command, rest = args[0], args[1:]
+    if command == "devices":
+        return cmd_devices(config)
+    if command == "track-devices":
+        return cmd_track_devices(config)
+    if device not in config["devices"]:
+        print(f"adb: device '{device}' not found", file=sys.stderr)
+        return 1
+    if command == "shell":
+        return cmd_shell(config, device, rest)
+    if command == "exec-in":
+        return cmd_exec_in(config, device, " ".join(rest))
+    if command == "exec-out":
+        return cmd_exec_out(config, device, " ".join(rest))
+    if command == "push":
+        return cmd_push(config, device, rest[0], rest[1])
+    if command == "pull":
+        return cmd_pull(config, device, rest[0], rest[1])
+    if command == "logcat":
+        return cmd_logcat(config, device, rest)
+    print(f"fake adb: unsupported command {command}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv) or 0)
+    except (BrokenPipeError, KeyboardInterrupt):
+        sys.exit(0)
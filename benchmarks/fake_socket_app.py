@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_fingerprint import bytes_digest
+from socket_transport import (KIND_ACK, KIND_HELLO, KIND_IMAGE, KIND_TEXT, encode_frame,
+                              read_frame_header)
+
+
+class FakeSocketApp:
+    """Stands in for the app's SocketSyncService on a loopback port.
+
+    Holds one clipboard item, acknowledges writes with the payload digest
+    the way the service does, and can push a "user copy" to connected hosts.
+    Like the service, it drops connections whose hello lacks its token. Use
+    it through SocketTransport(resolve_address=app.resolve_address, token=app.token).
+    """
+
+    def __init__(self, write_delay=0.0, token="benchmark-token"):
+        self.write_delay = write_delay
+        self.token = token
+        self.clipboard = None
+        self.writes = 0
+        self.server = None
+        self.writers = []
+        self.handlers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.serve, "127.0.0.1", 0)
+        return self
+
+    async def stop(self):
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        for handler in list(self.handlers):
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def resolve_address(self, device):
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serve(self, reader, writer):
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        authenticated = False
+        try:
+            while True:
+                kind, meta, payload_length = await read_frame_header(reader)
+                payload = await reader.readexactly(payload_length)
+                if kind == KIND_HELLO:
+                    if meta != self.token.encode("ascii"):
+                        break
+                    authenticated = True
+                    self.writers.append(writer)
+                    writer.write(encode_frame(KIND_HELLO))
+                elif not authenticated:
+                    break
+                elif kind in (KIND_TEXT, KIND_IMAGE):
+                    if self.write_delay:
+                        await asyncio.sleep(self.write_delay)
+                    self.clipboard = (kind, meta, payload)
+                    self.writes += 1
+                    writer.write(encode_frame(KIND_ACK, bytes_digest(payload).encode("ascii")))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.handlers.discard(handler)
+            if writer in self.writers:
+                self.writers.remove(writer)
+            writer.close()
+
+    async def push_text(self, text):
+        for writer in self.writers:
+            writer.write(encode_frame(KIND_TEXT, b"", text.encode("utf-8")))
+            await writer.drain()
+
+    async def push_image(self, data, mime_type="image/png", filename="image.png"):
+        for writer in self.writers:
+            writer.write(encode_frame(KIND_IMAGE, f"{mime_type}\n{filename}".encode("utf-8"), data))
+            await writer.drain()
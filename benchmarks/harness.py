@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+FAKE_ADB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_adb.py")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeAdbEnvironment:
+    """Puts the fake `adb` on PATH with a simulated device filesystem and logcat.
+
+    Every fake tool is a fresh Python process, so each spawn already costs
+    roughly what a real `adb` invocation does; spawn_delay adds to that.
+    """
+
+    def __init__(self, devices=("emulator-5554",), spawn_delay=0.0, am_delay=0.02,
+                 app_write_delay=0.05, transfer_rate=40e6, logcat_noise_per_sec=0, echo_logcat=False):
+        self.devices = list(devices)
+        self.config = {
+            "devices": {device: {"serial": f"SERIAL-{device}"} for device in self.devices},
+            "spawn_delay": spawn_delay,
+            "am_delay": am_delay,
+            "app_write_delay": app_write_delay,
+            "transfer_rate": transfer_rate,
+            "logcat_noise_per_sec": logcat_noise_per_sec,
+            "echo_logcat": echo_logcat,
+        }
+        self.state_dir = None
+        self.saved_env = {}
+
+    def __enter__(self):
+        self.state_dir = tempfile.mkdtemp(prefix="fake_adb_")
+        bin_dir = os.path.join(self.state_dir, "bin")
+        os.makedirs(bin_dir)
+        # Tiny launchers that tell fake_adb.py which tool it is standing in for
+        for tool in ("adb", "am", "getprop"):
+            path = os.path.join(bin_dir, tool)
+            with open(path, "w") as f:
+                f.write(
+                    f"#!{sys.executable}\n"
+                    "import runpy, sys\n"
+                    f"sys.argv[1:1] = ['--fake-tool', {tool!r}]\n"
+                    f"runpy.run_path({FAKE_ADB!r}, run_name='__main__')\n"
+                )
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+        for device in self.devices:
+            os.makedirs(os.path.join(self.state_dir, device, "root", "sdcard", "Android", "data",
+                                     "com.example.clipboard", "files"))
+            open(os.path.join(self.state_dir, device, "logcat.txt"), "w").close()
+        self.write_config()
+        open(self.spawn_log, "w").close()
+
+        for key, value in (("PATH", bin_dir + os.pathsep + os.environ.get("PATH", "")),
+                           ("FAKE_ADB_STATE", self.state_dir)):
+            self.saved_env[key] = os.environ.get(key)
+            os.environ[key] = value
+        return self
+
+    def __exit__(self, *exc):
+        for key, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    @property
+    def spawn_log(self):
+        return os.path.join(self.state_dir, "spawns.log")
+
+    def write_config(self):
+        with open(os.path.join(self.state_dir, "config.json"), "w") as f:
+            json.dump(self.config, f)
+
+    def spawn_count(self):
+        with open(self.spawn_log) as f:
+            return sum(1 for _ in f)
+
+    def set_device_text(self, device, text):
+        self._write_clipboard(device, {"type": "text", "data": text})
+
+    def set_device_image(self, device, data, mime="image/png", name="image.png"):
+        path = os.path.join(self.state_dir, device, "clipboard_image.dat")
+        with open(path, "wb") as f:
+            f.write(data)
+        self._write_clipboard(device, {"type": "image", "mime": mime, "name": name, "path": path})
+
+    def device_clipboard(self, device):
+        try:
+            with open(os.path.join(self.state_dir, device, "clipboard.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_clipboard(self, device, clip):
+        path = os.path.join(self.state_dir, device, "clipboard.json")
+        with open(path, "w") as f:
+            json.dump(clip, f)
+
+    def emit_copy_event(self, device, count=1):
+        """Appends copy-toast lines to the device logcat, as a user copy would."""
+        stamp = time.strftime("%m-%d %H:%M:%S")
+        with open(os.path.join(self.state_dir, device, "logcat.txt"), "a") as f:
+            for _ in range(count):
+                f.write(f"{stamp}.000 I/SemClipboardToastController( 1234): Copy toast is shown\n")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
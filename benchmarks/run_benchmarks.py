@@ -0,0 +1,449 @@
+"""Latency/throughput benchmarks for sync_clipboard.py against a fake `adb`.
+
+Runs repeatable scenarios through the real sync helpers with the scriptable
+stand-in from fake_adb.py on PATH, and reports p50/p99 latency and the
+number of adb processes spawned per operation.
+
+    python3 benchmarks/run_benchmarks.py
+    python3 benchmarks/run_benchmarks.py --scenario text --iterations 50 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_socket_app import FakeSocketApp  # noqa: E402
+from harness import FakeAdbEnvironment, percentile  # noqa: E402
+
+import sync_clipboard  # noqa: E402
+from image_transcoder import TranscodePolicy  # noqa: E402
+from host_clipboard import MemoryClipboardBackend  # noqa: E402
+from image_fingerprint import bytes_digest  # noqa: E402
+from socket_transport import SocketTransport  # noqa: E402
+from state_snapshot import StateSnapshot  # noqa: E402
+from sync_engine import SyncEngine  # noqa: E402
+
+DEVICE = "emulator-5554"
+
+
+class Result:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.spawns = 0
+        self.bytes = 0
+        self.notes = []
+
+    def summary(self):
+        count = len(self.latencies)
+        return {
+            "scenario": self.name,
+            "runs": count,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+            "spawns_per_op": round(self.spawns / count, 2) if count else 0,
+            "mb_per_s": round(self.bytes / sum(self.latencies) / 1e6, 1) if self.bytes and count else None,
+            "notes": "; ".join(self.notes),
+        }
+
+
+def timed(env, result, func, *args, payload_bytes=0):
+    before = env.spawn_count()
+    start = time.perf_counter()
+    value = func(*args)
+    result.latencies.append(time.perf_counter() - start)
+    result.spawns += env.spawn_count() - before
+    result.bytes += payload_bytes
+    return value
+
+
+def scenario_text(iterations, size):
+    result = Result(f"text_send_{size // 1024}k")
+    text = ("clipboard benchmark line\n" * (size // 25 + 1))[:size]
+    with FakeAdbEnvironment(devices=[DEVICE]) as env:
+        for i in range(iterations):
+            payload = f"{i}:{text}"
+            ok = timed(env, result, sync_clipboard.send_text_to_device, DEVICE, payload, payload_bytes=len(payload))
+            clip = env.device_clipboard(DEVICE)
+            if not ok or not clip or clip.get("data") != payload:
+                result.notes.append(f"run {i} did not reach the device")
+        sync_clipboard.close_adb_sessions()
+    return result
+
+
+def scenario_text_modes(iterations, sizes=(4 * 1024, 32 * 1024, 64 * 1024, 120 * 1024, 256 * 1024)):
+    """Inline broadcast vs gzip file push per text size, to place LARGE_TEXT_BYTES at the crossover."""
+    results = []
+    with FakeAdbEnvironment(devices=[DEVICE]) as env:
+        for size in sizes:
+            # Log-like text: repetitive enough to compress, varied enough not to be trivial
+            text = "".join(f"{i:08d} INFO sync worker-{i % 7} handled request in {i % 97} ms\n"
+                           for i in range(size // 56 + 1))[:size]
+            for mode, threshold in (("inline", float("inf")), ("gzip_file", 0)):
+                result = Result(f"text_{mode}_{size // 1024}k")
+                for i in range(iterations):
+                    payload = f"{i}:{text}"
+                    ok = timed(env, result, sync_clipboard.send_text_to_device, DEVICE, payload, threshold,
+                               payload_bytes=len(payload))
+                    clip = env.device_clipboard(DEVICE)
+                    if not ok or not clip or clip.get("data") != payload:
+                        result.notes.append("failed")
+                        break
+                results.append(result)
+        sync_clipboard.close_adb_sessions()
+    return results
+
+
+def make_image(megapixels):
+    from PIL import Image
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    return Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+
+
+def scenario_image(iterations, megapixels):
+    result = Result(f"image_send_{megapixels}mp")
+    try:
+        image = make_image(megapixels)
+    except ImportError:
+        result.notes.append("Pillow not installed")
+        return result
+    with FakeAdbEnvironment(devices=[DEVICE]) as env:
+        size = len(sync_clipboard.encode_image_png(image))
+        for i in range(iterations):
+            ok = timed(env, result, sync_clipboard.send_image_to_device, DEVICE, image, payload_bytes=size)
+            if not ok:
+                result.notes.append(f"run {i} failed")
+        sync_clipboard.close_adb_sessions()
+    return result
+
+
+def scenario_transcode(iterations, megapixels, lossless, transfer_rate=5e6):
+    """End-to-end image send over a slow link, encode included, full-size PNG vs adaptive policy."""
+    result = Result(f"image_{'png' if lossless else 'adaptive'}_{megapixels}mp")
+    try:
+        image = make_image(megapixels)
+    except ImportError:
+        result.notes.append("Pillow not installed")
+        return result
+    previous_policy = sync_clipboard.transcode_policy
+    sync_clipboard.transcode_policy = TranscodePolicy(lossless_only=lossless)
+    try:
+        with FakeAdbEnvironment(devices=[DEVICE], transfer_rate=transfer_rate) as env:
+            for i in range(iterations):
+                # Fresh cache and link estimate so every run pays for its own encode
+                sync_clipboard.image_artifacts.clear()
+                sync_clipboard.link_throughput.forget(DEVICE)
+                sync_clipboard.link_throughput.default = transfer_rate
+                if not timed(env, result, sync_clipboard.send_image_to_device, DEVICE, image):
+                    result.notes.append(f"run {i} failed")
+            clip = env.device_clipboard(DEVICE)
+            if clip and clip.get("type") == "image":
+                result.notes.append(f"{clip['mime']} {os.path.getsize(clip['path'])} bytes")
+            sync_clipboard.close_adb_sessions()
+    finally:
+        sync_clipboard.transcode_policy = previous_policy
+    return result
+
+
+def scenario_image_offload(iterations, workers, concurrent=3, megapixels=8):
+    """Concurrent image encodes in threads (workers=0) vs worker processes, and how late the loop runs meanwhile."""
+    result = Result(f"image_encode_x{concurrent}_{'threads' if workers == 0 else f'{workers}_procs'}")
+    try:
+        image = make_image(megapixels)
+    except ImportError:
+        result.notes.append("Pillow not installed")
+        return result
+    from image_transcoder import TranscodePlan
+    from image_workers import ImageWorkerPool
+    pool = ImageWorkerPool(workers)
+    pool.warm_up()
+    plan = TranscodePlan("JPEG", 85, None, "benchmark")
+    lags = []
+
+    async def probe(stop):
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    async def run():
+        for _ in range(iterations):
+            stop = asyncio.Event()
+            prober = asyncio.create_task(probe(stop))
+            start = time.perf_counter()
+            await asyncio.gather(*[asyncio.to_thread(pool.transcode, image, plan) for _ in range(concurrent)])
+            result.latencies.append(time.perf_counter() - start)
+            stop.set()
+            await prober
+
+    asyncio.run(run())
+    pool.shutdown()
+    result.notes.append(f"loop lag p99 {percentile(lags, 99) * 1000:.1f} ms, max {max(lags) * 1000:.1f} ms; "
+                        f"{os.cpu_count()} CPUs")
+    return result
+
+
+def scenario_multi_device(iterations, device_count):
+    """One host copy fanned out to several devices by SyncEngine, each send a concurrent task."""
+    result = Result(f"text_fanout_{device_count}dev")
+    devices = [f"emulator-{5554 + 2 * i}" for i in range(device_count)]
+    with FakeAdbEnvironment(devices=devices) as env:
+        engine = SyncEngine(clipboard_backend=MemoryClipboardBackend())
+        # Fixed device list instead of the adb track-devices registry
+        engine.registry = types.SimpleNamespace(devices=lambda: devices)
+
+        async def run():
+            for i in range(iterations):
+                text = f"fan-out {i}"
+                digest = bytes_digest(text.encode("utf-8"))
+                before = env.spawn_count()
+                start = time.perf_counter()
+                engine.fan_out("text", engine.send_text, text, digest)
+                while engine.scheduler.running or engine.scheduler.pending_count():
+                    await asyncio.sleep(0.002)
+                result.latencies.append(time.perf_counter() - start)
+                result.spawns += env.spawn_count() - before
+                missed = [device for device in devices if engine.device_content.get(device) != digest]
+                if missed:
+                    result.notes.append(f"run {i} did not reach {', '.join(missed)}")
+            await engine.scheduler.close()
+            await engine.transport.close_all()
+
+        asyncio.run(run())
+    return result
+
+
+def scenario_read(iterations, kind, size):
+    result = Result(f"read_{kind}_{size // 1024}k")
+    with FakeAdbEnvironment(devices=[DEVICE]) as env:
+        for i in range(iterations):
+            if kind == "text":
+                env.set_device_text(DEVICE, f"{i}:" + "x" * size)
+            else:
+                env.set_device_image(DEVICE, os.urandom(size))
+            data = timed(env, result, sync_clipboard.read_from_device, DEVICE, payload_bytes=size)
+            if data is None or data["type"] != kind:
+                result.notes.append(f"run {i} read {data and data['type']}")
+            if data and data.get("path"):
+                os.unlink(data["path"])
+        sync_clipboard.close_adb_sessions()
+    return result
+
+
+def scenario_copy_burst(iterations, burst, noise_per_sec):
+    """Android copy burst: logcat lines -> event queue -> read, end to end."""
+    result = Result(f"android_copy_burst_x{burst}")
+    with FakeAdbEnvironment(devices=[DEVICE], logcat_noise_per_sec=noise_per_sec) as env:
+        monitor = sync_clipboard.LogcatMonitor(DEVICE)
+        monitor.start()
+        time.sleep(1.0)
+        events = 0
+        for i in range(iterations):
+            env.set_device_text(DEVICE, f"burst {i}")
+            before = env.spawn_count()
+            start = time.perf_counter()
+            env.emit_copy_event(DEVICE, burst)
+            sync_clipboard.clipboard_event_queue.get(timeout=10)
+            data = sync_clipboard.read_from_device(DEVICE)
+            result.latencies.append(time.perf_counter() - start)
+            result.spawns += env.spawn_count() - before
+            time.sleep(0.2)
+            # Drain the rest of the burst; a real loop debounces these
+            while True:
+                try:
+                    sync_clipboard.clipboard_event_queue.get_nowait()
+                    events += 1
+                except queue.Empty:
+                    break
+            events += 1
+            if not data or data.get("data") != f"burst {i}":
+                result.notes.append(f"run {i} read {data}")
+        monitor.stop_event.set()
+        result.notes.append(f"{events} events queued, logcat lines read {monitor.lines_read}")
+        sync_clipboard.close_adb_sessions()
+    return result
+
+
+def scenario_socket_text(iterations, size):
+    """Text sends through SocketTransport to the stand-in service (compare with text_send_*)."""
+    result = Result(f"socket_text_send_{size // 1024}k")
+    text = ("clipboard benchmark line\n" * (size // 25 + 1))[:size]
+
+    async def run():
+        app = await FakeSocketApp().start()
+        transport = SocketTransport(resolve_address=app.resolve_address, token=app.token)
+        try:
+            for i in range(iterations):
+                payload = f"{i}:{text}"
+                start = time.perf_counter()
+                ok = await transport.send_text(DEVICE, payload)
+                result.latencies.append(time.perf_counter() - start)
+                result.bytes += len(payload)
+                if not ok or app.clipboard[2] != payload.encode("utf-8"):
+                    result.notes.append(f"run {i} did not reach the service")
+        finally:
+            await transport.close_all()
+            await app.stop()
+
+    with FakeAdbEnvironment(devices=[DEVICE]):
+        asyncio.run(run())
+    return result
+
+
+class UngatedMemoryBackend(MemoryClipboardBackend):
+    """Memory backend without a change primitive, i.e. the old always-probe behaviour."""
+
+    def change_token(self):
+        return None
+
+
+def scenario_host_poll(iterations, gated, extract_delay=0.02):
+    """Cost of one idle host clipboard poll, with and without the change-count gate."""
+    result = Result(f"host_poll_{'gated' if gated else 'ungated'}")
+    backend_class = MemoryClipboardBackend if gated else UngatedMemoryBackend
+    backend = backend_class(text="unchanged", extract_delay=extract_delay)
+    engine = SyncEngine(clipboard_backend=backend)
+
+    async def poll_loop():
+        engine.last_mac_text = backend.text
+        engine.last_change_token = backend.change_token()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await engine.check_host_clipboard()
+            result.latencies.append(time.perf_counter() - start)
+
+    asyncio.run(poll_loop())
+    result.notes.append(f"{backend.extractions} full extractions")
+    return result
+
+
+def scenario_poll_schedule(iterations, adaptive, idle_seconds=10.0, gap=0.3):
+    """Host copy detection latency and idle poll rate, fixed 0.5 s polling vs the adaptive scheduler.
+
+    Each iteration idles for idle_seconds and then makes three copies gap apart.
+    """
+    result = Result(f"host_copy_detect_{'adaptive' if adaptive else 'fixed_500ms'}")
+    backend = MemoryClipboardBackend(text="start")
+    engine = SyncEngine(clipboard_backend=backend, poll_interval=None if adaptive else 0.5)
+    idle_polls = [0, 0.0]
+
+    async def wait_detected(text):
+        start = time.perf_counter()
+        while engine.last_mac_text != text:
+            await asyncio.sleep(0.001)
+        return time.perf_counter() - start
+
+    async def run():
+        engine.last_mac_text = backend.text
+        engine.last_change_token = backend.change_token()
+        poller = asyncio.create_task(engine.poll_host_clipboard())
+        for i in range(iterations):
+            # Poll rate over the second half of the idle phase, once backed off
+            await asyncio.sleep(idle_seconds / 2)
+            polls = engine.poll_scheduler.polls
+            await asyncio.sleep(idle_seconds / 2)
+            idle_polls[0] += engine.poll_scheduler.polls - polls
+            idle_polls[1] += idle_seconds / 2
+            for j in range(3):
+                text = f"copy {i}.{j}"
+                backend.set_text(text)
+                result.latencies.append(await wait_detected(text))
+                await asyncio.sleep(gap)
+        poller.cancel()
+        await asyncio.gather(poller, return_exceptions=True)
+
+    asyncio.run(run())
+    stats = engine.poll_scheduler.stats()
+    result.notes.append(f"{idle_polls[0] / idle_polls[1]:.1f} polls/s while idle, "
+                        f"{stats['cpu_per_poll_ms']} ms CPU/poll, budget used {stats['budget_used']}")
+    return result
+
+
+def scenario_startup(iterations, device_count=3, spawn_delay=0.1, extract_delay=0.1):
+    """Time until every device is watched and the first host poll has run, cold vs from a saved state.
+
+    spawn_delay stands in for a real `adb shell getprop` round trip and
+    extract_delay for a full host clipboard read.
+    """
+    devices = [f"emulator-{5554 + 2 * i}" for i in range(device_count)]
+    cold, warm = Result("startup_cold"), Result("startup_warm")
+    with FakeAdbEnvironment(devices=devices, spawn_delay=spawn_delay) as env, \
+            tempfile.TemporaryDirectory() as state_dir:
+        backend = MemoryClipboardBackend(text="already synced", extract_delay=extract_delay)
+
+        async def start(result, snapshot):
+            engine = SyncEngine(clipboard_backend=backend, state_snapshot=snapshot)
+            before = env.spawn_count()
+            start_time = time.perf_counter()
+            runner = asyncio.create_task(engine.run())
+            while (len(engine.logcat_tasks) < device_count or engine.poll_scheduler.polls < 1) and not runner.done():
+                await asyncio.sleep(0.002)
+            result.latencies.append(time.perf_counter() - start_time)
+            result.spawns += env.spawn_count() - before
+            # Stopping saves the state the next start picks up
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            # Let the background serial check finish while the fake adb is still there
+            if engine.registry.verifier is not None:
+                await asyncio.to_thread(engine.registry.verifier.join, 10)
+
+        for i in range(iterations):
+            path = os.path.join(state_dir, f"state-{i}.json")
+            asyncio.run(start(cold, StateSnapshot(path)))
+            asyncio.run(start(warm, StateSnapshot(path)))
+    return [cold, warm]
+
+
+SCENARIOS = {
+    "text": lambda n: [scenario_text(n, 1024), scenario_text(n, 64 * 1024)],
+    "text_modes": lambda n: scenario_text_modes(max(1, n // 4)),
+    "image": lambda n: [scenario_image(max(1, n // 4), 2), scenario_image(max(1, n // 4), 8)],
+    "transcode": lambda n: [scenario_transcode(max(1, n // 4), 12, lossless=True),
+                            scenario_transcode(max(1, n // 4), 12, lossless=False)],
+    "offload": lambda n: [scenario_image_offload(max(1, n // 4), 0),
+                          scenario_image_offload(max(1, n // 4), max(2, min(4, (os.cpu_count() or 1) - 1)))],
+    "multi": lambda n: [scenario_multi_device(n, 3)],
+    "read": lambda n: [scenario_read(n, "text", 1024), scenario_read(max(1, n // 4), "image", 5 * 1024 * 1024)],
+    "burst": lambda n: [scenario_copy_burst(max(1, n // 2), 5, noise_per_sec=500)],
+    "socket": lambda n: [scenario_socket_text(n, 1024), scenario_socket_text(n, 64 * 1024),
+                         scenario_socket_text(n, 128 * 1024)],
+    "poll": lambda n: [scenario_host_poll(n, gated=False), scenario_host_poll(n, gated=True)],
+    "startup": lambda n: scenario_startup(max(1, n // 4)),
+    "poll_schedule": lambda n: [scenario_poll_schedule(max(1, n // 5), adaptive=False),
+                                scenario_poll_schedule(max(1, n // 5), adaptive=True)],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append",
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        results.extend(result.summary() for result in SCENARIOS[name](args.iterations))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':28} {'runs':>5} {'p50 ms':>9} {'p99 ms':>9} {'spawns/op':>10} {'MB/s':>7}  notes")
+    for row in results:
+        mb = "" if row["mb_per_s"] is None else row["mb_per_s"]
+        print(f"{row['scenario']:28} {row['runs']:>5} {row['p50_ms']:>9} {row['p99_ms']:>9} "
+              f"{row['spawns_per_op']:>10} {mb:>7}  {row['notes']}")
+
+
+if __name__ == "__main__":
+    main()
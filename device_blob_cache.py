@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+# Must match BLOB_CACHE_MAX_FILES / BLOB_CACHE_MAX_BYTES in WriteReceiver so
+# the host's view and the device's eviction roughly agree
+MAX_BLOBS = 16
+MAX_BLOB_BYTES = 256 * 1024 * 1024
+
+
+class DeviceBlobCache:
+    """Host-side record of the images each device already holds in its blob cache.
+
+    Blobs are the pushed image files (header + payload) that WriteReceiver
+    keeps under files/blobs/, named by the digest of their contents. The
+    record is keyed by the image's pixel digest, so re-sending a recent
+    image can skip both the encode and the push. The device evicts on its
+    own, so an entry here is only a hint: a miss on the device must fall
+    back to a full push and drop the entry.
+    """
+
+    def __init__(self, max_blobs=MAX_BLOBS, max_bytes=MAX_BLOB_BYTES):
+        self.max_blobs = max_blobs
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # device -> OrderedDict(image digest -> (blob path, size))
+        self.devices = {}
+
+    def lookup(self, device, digest):
+        if digest is None:
+            return None
+        with self.lock:
+            blobs = self.devices.get(device)
+            if not blobs or digest not in blobs:
+                return None
+            blobs.move_to_end(digest)
+            return blobs[digest][0]
+
+    def add(self, device, digest, blob_path, size):
+        if digest is None:
+            return
+        with self.lock:
+            blobs = self.devices.setdefault(device, OrderedDict())
+            blobs[digest] = (blob_path, size)
+            blobs.move_to_end(digest)
+            total = sum(entry[1] for entry in blobs.values())
+            while len(blobs) > 1 and (len(blobs) > self.max_blobs or total > self.max_bytes):
+                _, (_, evicted_size) = blobs.popitem(last=False)
+                total -= evicted_size
+
+    def discard(self, device, digest):
+        with self.lock:
+            blobs = self.devices.get(device)
+            if blobs:
+                blobs.pop(digest, None)
+
+    def forget(self, device):
+        with self.lock:
+            self.devices.pop(device, None)
@@ -0,0 +1,218 @@
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sync_metrics import metrics
+
+
+def parse_device_list(payload):
+    """Parses one `adb track-devices` message into {handle: state}."""
+    states = {}
+    for line in payload.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            states[parts[0]] = parts[1]
+    return states
+
+
+class DeviceRegistry(threading.Thread):
+    """Keeps the connected device list in memory from the `adb track-devices` stream.
+
+    Each handle's real serial number is probed once and cached, so IP and
+    mDNS handles for the same phone are collapsed to one device. New
+    handles are probed in parallel. Handles found in known_serials (e.g.
+    from the last run) attach straight away and are re-probed in the
+    background; if the serial changed, the device list is recomputed. The
+    on_attach/on_detach callbacks fire only when the set of unique devices
+    actually changes.
+    """
+
+    def __init__(self, on_attach=None, on_detach=None, probe_serial=None, known_serials=None, serials_seen=None,
+                 verify_delay=1.0):
+        super().__init__()
+        self.daemon = True
+        self.stop_event = threading.Event()
+        self.ready_event = threading.Event()
+        self.on_attach = on_attach
+        self.on_detach = on_detach
+        self.probe_serial = probe_serial or self._probe_serial
+        self.lock = threading.Lock()
+        # Serializes update() between the tracker thread and serial checks
+        self.update_lock = threading.RLock()
+        self.process = None
+        # handle -> serial (or the handle itself if it could not be probed)
+        self.serials = {}
+        # handle -> serial for every handle probed so far, this run or before
+        self.known_serials = dict(known_serials or {})
+        # handle -> when it was last online, for handles in known_serials that are not online now
+        self.serials_seen = dict(serials_seen or {})
+        self.verify_delay = verify_delay
+        self.states = {}
+        # Background re-probe of handles attached from known_serials, if any
+        self.verifier = None
+        # Ordered list of unique device handles currently online
+        self.active = []
+
+    def devices(self):
+        """Returns the current unique device handles without spawning anything."""
+        with self.lock:
+            return list(self.active)
+
+    def serial_map(self, max_age=None):
+        """{handle: {"serial", "seen_at"}} for handles online now or seen within max_age seconds.
+
+        seen_at is None for handles that are online now.
+        """
+        now = time.time()
+        entries = {}
+        with self.lock:
+            for handle, serial in self.known_serials.items():
+                seen_at = None if handle in self.serials else self.serials_seen.get(handle, 0)
+                if seen_at is None or max_age is None or now - seen_at <= max_age:
+                    entries[handle] = {"serial": serial, "seen_at": seen_at}
+        return entries
+
+    def serial(self, handle):
+        return self.serials.get(handle, handle)
+
+    def wait_ready(self, timeout=5):
+        return self.ready_event.wait(timeout)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.process is not None:
+            try:
+                self.process.terminate()
+            except Exception:
+                pass
+
+    def run(self):
+        backoff = 0.5
+        while not self.stop_event.is_set():
+            try:
+                metrics.count("subprocesses.adb")
+                self.process = subprocess.Popen(
+                    ["adb", "track-devices"],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL
+                )
+                self._read_stream(self.process.stdout)
+                backoff = 0.5
+            except Exception as e:
+                print(f"Device tracker error: {e}")
+            finally:
+                if self.process is not None:
+                    try:
+                        self.process.terminate()
+                    except Exception:
+                        pass
+
+            if self.stop_event.is_set():
+                break
+            # adb server went away; everything is detached until it comes back
+            self.update({})
+            self.ready_event.set()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+
+    def _read_stream(self, stream):
+        while not self.stop_event.is_set():
+            header = stream.read(4)
+            if len(header) < 4:
+                return
+            length = int(header, 16)
+            payload = stream.read(length) if length else b""
+            if len(payload) < length:
+                return
+            self.update(parse_device_list(payload.decode("utf-8", errors="replace")))
+            self.ready_event.set()
+
+    def update(self, states):
+        """Applies a full {handle: state} snapshot and fires attach/detach callbacks."""
+        with self.update_lock:
+            self._update(states)
+
+    def _update(self, states):
+        self.states = states
+        online = [handle for handle, state in states.items() if state == "device"]
+
+        new = [handle for handle in online if handle not in self.serials]
+        cached = [handle for handle in new if handle in self.known_serials]
+        probed = self.probe_serials([handle for handle in new if handle not in self.known_serials])
+        for handle in cached:
+            self.serials[handle] = self.known_serials[handle]
+        for handle, serial in probed.items():
+            self.serials[handle] = serial or handle
+            if serial:
+                with self.lock:
+                    self.known_serials[handle] = serial
+        for handle in list(self.serials):
+            if handle not in online:
+                del self.serials[handle]
+                with self.lock:
+                    self.serials_seen[handle] = time.time()
+        if cached:
+            self.verifier = threading.Thread(target=self._verify_serials, args=(cached,), daemon=True)
+            self.verifier.start()
+
+        unique = []
+        seen_serials = set()
+        with self.lock:
+            # Prefer handles that are already active so a device keeps its handle
+            for handle in self.active + online:
+                if handle in online and handle not in unique:
+                    serial = self.serials[handle]
+                    if serial not in seen_serials:
+                        seen_serials.add(serial)
+                        unique.append(handle)
+            attached = [handle for handle in unique if handle not in self.active]
+            detached = [handle for handle in self.active if handle not in unique]
+            self.active = unique
+
+        for handle in detached:
+            print(f"[{handle}] Device detached")
+            if self.on_detach:
+                self.on_detach(handle)
+        for handle in attached:
+            print(f"[{handle}] Device attached")
+            if self.on_attach:
+                self.on_attach(handle)
+
+    def probe_serials(self, handles):
+        """Probes several handles at once; returns {handle: serial or None}."""
+        if len(handles) <= 1:
+            return {handle: self.probe_serial(handle) for handle in handles}
+        with ThreadPoolExecutor(max_workers=min(8, len(handles))) as pool:
+            return dict(zip(handles, pool.map(self.probe_serial, handles)))
+
+    def _verify_serials(self, handles):
+        """Re-probes handles that attached from cached serials and fixes any that changed."""
+        # Stay out of the way of startup; a stale serial only matters once two handles share it
+        if self.stop_event.wait(self.verify_delay):
+            return
+        changed = False
+        for handle, serial in self.probe_serials(handles).items():
+            if not serial:
+                continue
+            with self.lock:
+                if self.known_serials.get(handle) != serial:
+                    self.known_serials[handle] = serial
+                    changed = True
+        if changed:
+            with self.update_lock:
+                # Forget the stale serials and re-apply the latest device list
+                for handle in handles:
+                    self.serials.pop(handle, None)
+                self._update(self.states)
+
+    def _probe_serial(self, handle):
+        metrics.count("subprocesses.adb", device=handle)
+        try:
+            return subprocess.check_output(
+                ["adb", "-s", handle, "shell", "getprop", "ro.serialno"],
+                timeout=5
+            ).decode("utf-8").strip()
+        except Exception as e:
+            print(f"Warning: Could not get serial for {handle}: {e}")
+            return None
@@ -0,0 +1,94 @@
+import asyncio
+import functools
+from collections import OrderedDict
+
+from sync_metrics import metrics
+
+
+class CoalescingScheduler:
+    """Runs clipboard jobs on the event loop, at most one per (direction, device).
+
+    While a job for a key is running, newer submissions for that key are
+    merged into a single pending job (latest wins) that starts when the
+    running one ends. With supersede=True the running job is cancelled
+    straight away, for transfers whose content is already out of date.
+    Pending jobs are bounded by max_pending across all keys; the oldest is
+    dropped beyond that. Coalesced, superseded and dropped jobs are counted
+    in metrics as <direction>_coalesced / _superseded / _dropped.
+    """
+
+    def __init__(self, max_pending=32):
+        self.max_pending = max_pending
+        self.running = {}
+        # key -> (job, delay), oldest first
+        self.pending = OrderedDict()
+        self.closed = False
+
+    def submit(self, key, job, supersede=False, delay=0.0):
+        """Schedules job (a zero-argument coroutine function) under key = (direction, device).
+
+        delay lets a burst of submissions settle into one run before the job starts.
+        """
+        if self.closed:
+            return
+        direction, device = key
+        running = self.running.get(key)
+        if running is None:
+            self._start(key, job, delay)
+            return
+
+        if supersede:
+            running.cancel()
+            metrics.count(f"{direction}_superseded", device=device)
+        if key in self.pending:
+            metrics.count(f"{direction}_coalesced", device=device)
+        self.pending[key] = (job, delay)
+        self.pending.move_to_end(key)
+        while len(self.pending) > self.max_pending:
+            (dropped_direction, dropped_device), _ = self.pending.popitem(last=False)
+            metrics.count(f"{dropped_direction}_dropped", device=dropped_device)
+
+    def _start(self, key, job, delay):
+        task = asyncio.create_task(self._run(key, job, delay))
+        self.running[key] = task
+        # A done callback rather than a finally in _run: a task cancelled
+        # before its first step never runs its body
+        task.add_done_callback(functools.partial(self._finished, key))
+
+    def _finished(self, key, task):
+        if self.running.get(key) is not task:
+            return
+        del self.running[key]
+        following = self.pending.pop(key, None)
+        if following is not None and not self.closed:
+            self._start(key, *following)
+
+    async def _run(self, key, job, delay):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            await job()
+        except asyncio.CancelledError:
+            # Superseded by newer content (or shutting down)
+            pass
+        except Exception as e:
+            print(f"[{key[1]}] {key[0]} job failed: {e}")
+
+    def discard(self, device):
+        """Cancels everything scheduled for a device, e.g. when it detaches."""
+        for key in [key for key in self.pending if key[1] == device]:
+            del self.pending[key]
+        for key, task in list(self.running.items()):
+            if key[1] == device:
+                task.cancel()
+
+    def pending_count(self):
+        return len(self.pending)
+
+    async def close(self):
+        self.closed = True
+        self.pending.clear()
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,168 @@
+import ctypes
+import ctypes.util
+import sys
+import threading
+import time
+
+
+class ClipboardBackend:
+    """Host clipboard access used by the sync engine.
+
+    change_token() is the cheap primitive: it must not read clipboard
+    contents, and its value changes whenever the clipboard does. Returning
+    None means the backend cannot tell, so the caller has to extract the
+    full contents every time.
+    """
+
+    name = "base"
+
+    def change_token(self):
+        return None
+
+    def get_text(self):
+        raise NotImplementedError
+
+    def set_text(self, text):
+        raise NotImplementedError
+
+    def get_image(self):
+        raise NotImplementedError
+
+    def set_image(self, image, digest=None):
+        """Sets an image; digest is the image's content digest when the caller already has it."""
+        raise NotImplementedError
+
+    def set_image_file(self, path, image_format):
+        """Sets an encoded PNG/JPEG file as-is, without decoding it.
+
+        Returns False if the backend cannot take encoded files, in which case
+        the caller decodes the image and uses set_image() instead.
+        """
+        return False
+
+
+class PyperclipBackend(ClipboardBackend):
+    """Text through pyperclip, images through the macOS helpers; no change primitive."""
+
+    name = "pyperclip"
+
+    def get_text(self):
+        import pyperclip
+        return pyperclip.paste()
+
+    def set_text(self, text):
+        import pyperclip
+        pyperclip.copy(text)
+
+    def get_image(self):
+        # Imported here: sync_clipboard imports the engine that uses this module
+        from sync_clipboard import get_mac_clipboard_image
+        return get_mac_clipboard_image()
+
+    def set_image(self, image, digest=None):
+        from sync_clipboard import set_mac_clipboard_image
+        return set_mac_clipboard_image(image, digest)
+
+    def set_image_file(self, path, image_format):
+        if sys.platform != "darwin":
+            return False
+        from sync_clipboard import set_mac_clipboard_image_file
+        return set_mac_clipboard_image_file(path, image_format)
+
+
+class MacClipboardBackend(PyperclipBackend):
+    """macOS backend gated on NSPasteboard.changeCount, read through the Objective-C runtime via ctypes."""
+
+    name = "macos"
+
+    def __init__(self):
+        self._objc = None
+        self._pasteboard = None
+        self._change_count_sel = None
+        try:
+            ctypes.cdll.LoadLibrary("/System/Library/Frameworks/AppKit.framework/AppKit")
+            objc = ctypes.cdll.LoadLibrary(ctypes.util.find_library("objc"))
+            objc.objc_getClass.restype = ctypes.c_void_p
+            objc.objc_getClass.argtypes = [ctypes.c_char_p]
+            objc.sel_registerName.restype = ctypes.c_void_p
+            objc.sel_registerName.argtypes = [ctypes.c_char_p]
+            objc.objc_msgSend.restype = ctypes.c_void_p
+            objc.objc_msgSend.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+            pasteboard_class = objc.objc_getClass(b"NSPasteboard")
+            self._pasteboard = objc.objc_msgSend(pasteboard_class, objc.sel_registerName(b"generalPasteboard"))
+            self._change_count_sel = objc.sel_registerName(b"changeCount")
+            self._objc = objc
+        except Exception as e:
+            print(f"NSPasteboard change count unavailable, polling full clipboard: {e}")
+
+    def change_token(self):
+        if self._objc is None or not self._pasteboard:
+            return None
+        # changeCount returns an NSInteger; the pointer-sized result is the value
+        return self._objc.objc_msgSend(self._pasteboard, self._change_count_sel)
+
+
+class MemoryClipboardBackend(ClipboardBackend):
+    """In-process clipboard with a change counter, for tests and benchmarks off macOS.
+
+    extract_delay simulates how long a full read costs on a real system so
+    the effect of gating can be measured.
+    """
+
+    name = "memory"
+
+    def __init__(self, text="", image=None, extract_delay=0.0):
+        self.lock = threading.Lock()
+        self.text = text
+        self.image = image
+        # (format, bytes) of the last image set from an encoded file
+        self.image_file = None
+        self.change_count = 0
+        self.extract_delay = extract_delay
+        self.extractions = 0
+
+    def change_token(self):
+        return self.change_count
+
+    def get_text(self):
+        self._extract()
+        return self.text
+
+    def set_text(self, text):
+        with self.lock:
+            self.text = text
+            self.image = None
+            self.image_file = None
+            self.change_count += 1
+
+    def get_image(self):
+        self._extract()
+        return self.image
+
+    def set_image(self, image, digest=None):
+        with self.lock:
+            self.image = image
+            self.image_file = None
+            self.change_count += 1
+        return True
+
+    def set_image_file(self, path, image_format):
+        with open(path, "rb") as f:
+            data = f.read()
+        with self.lock:
+            self.image = None
+            self.image_file = (image_format, data)
+            self.change_count += 1
+        return True
+
+    def _extract(self):
+        self.extractions += 1
+        if self.extract_delay:
+            time.sleep(self.extract_delay)
+
+
+def default_backend():
+    if sys.platform == "darwin":
+        return MacClipboardBackend()
+    return PyperclipBackend()
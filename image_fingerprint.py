@@ -0,0 +1,89 @@
+import hashlib
+
+# numpy is optional and slow to import; loaded on the first perceptual hash
+_numpy = None
+
+DIGEST_SIZE = 16
+
+
+def bytes_digest(data):
+    """Stable hex digest of an encoded payload (PNG/JPEG bytes, text, ...).
+
+    Truncated SHA-256, so the Android app can compute the same value with
+    MessageDigest for what it writes to its clipboard.
+    """
+    return hashlib.sha256(data).hexdigest()[:DIGEST_SIZE * 2]
+
+
+class BytesDigest:
+    """Incremental bytes_digest() for payloads streamed in chunks."""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+
+    def update(self, chunk):
+        self.hasher.update(chunk)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()[:DIGEST_SIZE * 2]
+
+
+def exact_digest(image):
+    """Stable hex digest of an image's raw pixel buffer, without encoding it.
+
+    Covers mode, size and every pixel, so two images only match if they are
+    pixel-identical, and the value is the same across runs (unlike hash()).
+    """
+    if image is None:
+        return None
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    hasher.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("ascii"))
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+def perceptual_hash(image, hash_size=8):
+    """Difference hash (dHash) as an int of hash_size * hash_size bits.
+
+    Near-duplicates (re-encoded, slightly resized or recompressed copies of
+    the same picture) land within a few bits of each other.
+    """
+    if image is None:
+        return None
+    small = image.convert("L").resize((hash_size + 1, hash_size))
+    numpy = load_numpy()
+    if numpy is not None:
+        pixels = numpy.asarray(small, dtype=numpy.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        return int.from_bytes(numpy.packbits(bits).tobytes(), "big")
+
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col + 1] > pixels[offset + col])
+    return value
+
+
+def load_numpy():
+    """numpy if it is installed, else None; imported once, on first use."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def is_near_duplicate(a, b, threshold=5):
+    """True if two perceptual hashes differ in at most threshold bits."""
+    if a is None or b is None:
+        return False
+    return hamming_distance(a, b) <= threshold
@@ -0,0 +1,97 @@
+import struct
+from io import BytesIO
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOI = b"\xff\xd8"
+# JPEG start-of-frame markers carrying the dimensions (not DHT/JPG/DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def probe_image(source):
+    """Reads format, size and EXIF orientation from a PNG/JPEG's headers only.
+
+    source is a file path or the encoded bytes. Returns a dict with format,
+    width, height and orientation (None when the file has no EXIF
+    orientation), or None for anything that is not a well-formed PNG/JPEG.
+    """
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return _probe(BytesIO(source))
+        with open(source, "rb") as f:
+            return _probe(f)
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def _probe(f):
+    head = f.read(8)
+    if head == PNG_SIGNATURE:
+        return _probe_png(f)
+    if head[:2] == JPEG_SOI:
+        f.seek(2)
+        return _probe_jpeg(f)
+    return None
+
+
+def _probe_png(f):
+    length, chunk_type = struct.unpack(">I4s", f.read(8))
+    if chunk_type != b"IHDR" or length < 8:
+        return None
+    width, height = struct.unpack(">II", f.read(8))
+    return {"format": "PNG", "width": width, "height": height, "orientation": None}
+
+
+def _probe_jpeg(f):
+    orientation = None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            # Markers without a length field
+            continue
+        if code == 0xD9 or code == 0xDA:
+            # End of image or start of scan before any frame header
+            return None
+        (length,) = struct.unpack(">H", f.read(2))
+        if length < 2:
+            return None
+        if code == 0xE1 and orientation is None:
+            segment = f.read(length - 2)
+            orientation = _exif_orientation(segment)
+            continue
+        if code in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", f.read(5))
+            return {"format": "JPEG", "width": width, "height": height, "orientation": orientation}
+        f.seek(length - 2, 1)
+
+
+def _exif_orientation(segment):
+    """Orientation value from an APP1 Exif segment, or None."""
+    if not segment.startswith(b"Exif\x00\x00"):
+        return None
+    tiff = segment[6:]
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return None
+    (ifd_offset,) = struct.unpack(endian + "I", tiff[4:8])
+    (count,) = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])
+    for index in range(count):
+        entry = ifd_offset + 2 + index * 12
+        tag, _, _ = struct.unpack(endian + "HHI", tiff[entry:entry + 8])
+        if tag == EXIF_ORIENTATION_TAG:
+            (value,) = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])
+            return value
+    return None
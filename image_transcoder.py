@@ -0,0 +1,172 @@
+import threading
+from io import BytesIO
+
+# Whether Pillow can write WebP; checked on first use, which imports PIL
+_webp_available = None
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+
+
+class TranscodePlan:
+    """How one image is encoded for one transfer."""
+
+    def __init__(self, format="PNG", quality=None, max_dimension=None, reason="passthrough"):
+        self.format = format
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.reason = reason
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.format]
+
+    @property
+    def filename(self):
+        return f"clipboard_image.{EXTENSIONS[self.format]}"
+
+    @property
+    def lossless(self):
+        return self.format == "PNG" and self.max_dimension is None
+
+    def key(self):
+        """Artifact cache kind for the bytes this plan produces."""
+        if self.lossless:
+            return "png"
+        return f"{self.format.lower()}:{self.quality}:{self.max_dimension}"
+
+    def to_dict(self):
+        return {
+            "format": self.format,
+            "quality": self.quality,
+            "max_dimension": self.max_dimension,
+            "reason": self.reason,
+        }
+
+    def __repr__(self):
+        return f"TranscodePlan({self.format}, quality={self.quality}, max_dimension={self.max_dimension}, {self.reason})"
+
+
+class TranscodePolicy:
+    """Chooses a TranscodePlan from image size, resolution and link throughput.
+
+    Small images, and anything the link can move within target_seconds as
+    lossless PNG, are passed through untouched. Larger ones are capped at
+    max_dimension and re-encoded lossily (WebP when Pillow has it, JPEG
+    otherwise; images with transparency stay PNG unless WebP is available),
+    with a lower quality the further over budget the transfer would be.
+    """
+
+    def __init__(self, passthrough_bytes=512 * 1024, target_seconds=0.5, max_dimension=2560,
+                 prefer_webp=True, lossless_only=False):
+        self.passthrough_bytes = passthrough_bytes
+        self.target_seconds = target_seconds
+        self.max_dimension = max_dimension
+        self.prefer_webp = prefer_webp
+        self.lossless_only = lossless_only
+
+    def choose(self, image, throughput, png_bytes=None):
+        """Picks a plan; png_bytes is the lossless size if already known, else it is estimated."""
+        if self.lossless_only:
+            return TranscodePlan(reason="lossless only")
+
+        width, height = image.size
+        if png_bytes is None:
+            png_bytes = estimate_png_bytes(image)
+        if png_bytes <= self.passthrough_bytes:
+            return TranscodePlan(reason="small")
+
+        oversized = self.max_dimension is not None and max(width, height) > self.max_dimension
+        max_dimension = self.max_dimension if oversized else None
+        if oversized:
+            # Lossless size after the downscale scales with the pixel count
+            png_bytes = png_bytes * (self.max_dimension / max(width, height)) ** 2
+        seconds = png_bytes / throughput if throughput else 0
+        if seconds <= self.target_seconds:
+            if oversized:
+                return TranscodePlan("PNG", None, max_dimension, "downscale")
+            return TranscodePlan(reason="fast link")
+
+        over_budget = seconds / self.target_seconds
+        if over_budget < 4:
+            quality = 90
+        elif over_budget < 16:
+            quality = 80
+        else:
+            quality = 70
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        if self.prefer_webp and webp_available():
+            return TranscodePlan("WEBP", quality, max_dimension, f"{over_budget:.1f}x over budget")
+        if has_alpha:
+            return TranscodePlan("PNG", None, max_dimension, "transparent, no WebP")
+        return TranscodePlan("JPEG", quality, max_dimension, f"{over_budget:.1f}x over budget")
+
+
+def webp_available():
+    global _webp_available
+    if _webp_available is None:
+        try:
+            from PIL import features
+            _webp_available = features.check("webp")
+        except Exception:
+            _webp_available = False
+    return _webp_available
+
+
+def estimate_png_bytes(image):
+    """Rough lossless size: PNG typically lands around half of the raw pixel buffer."""
+    width, height = image.size
+    return width * height * len(image.getbands()) // 2
+
+
+def transcode(image, plan):
+    """Encodes the image according to plan and returns the bytes."""
+    if plan.max_dimension is not None and max(image.size) > plan.max_dimension:
+        image = image.copy()
+        image.thumbnail((plan.max_dimension, plan.max_dimension))
+
+    if plan.format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif plan.format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    output = BytesIO()
+    if plan.format == "PNG":
+        image.save(output, format="PNG")
+    elif plan.format == "JPEG":
+        image.save(output, format="JPEG", quality=plan.quality, optimize=True)
+    else:
+        image.save(output, format="WEBP", quality=plan.quality, method=4)
+    return output.getvalue()
+
+
+class LinkThroughput:
+    """Per-device transfer rate in bytes/second, smoothed over recent pushes."""
+
+    def __init__(self, default=4 * 1024 * 1024, smoothing=0.3, min_bytes=64 * 1024):
+        self.default = default
+        self.smoothing = smoothing
+        # Pushes this small are dominated by fixed costs and say little about the link
+        self.min_bytes = min_bytes
+        self.lock = threading.Lock()
+        self.rates = {}
+
+    def get(self, device):
+        with self.lock:
+            return self.rates.get(device, self.default)
+
+    def record(self, device, nbytes, seconds):
+        if nbytes < self.min_bytes or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        with self.lock:
+            previous = self.rates.get(device)
+            if previous is None:
+                self.rates[device] = rate
+            else:
+                self.rates[device] = previous + self.smoothing * (rate - previous)
+
+    def forget(self, device):
+        with self.lock:
+            self.rates.pop(device, None)
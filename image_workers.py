@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import shared_memory
+
+from image_headers import probe_image
+from image_transcoder import transcode
+
+# Modes whose raw buffer is the whole image (no palette), so pixels can be
+# shared as plain bytes; anything else is handled in-process
+SHARED_MODES = {"1", "L", "LA", "I", "I;16", "F", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr"}
+# Below this the round trip costs more than the work it moves
+MIN_OFFLOAD_PIXELS = 1024 * 1024
+# Image.info keys that affect how an image is encoded
+ENCODER_INFO_KEYS = ("transparency", "icc_profile", "dpi")
+
+
+def share_image(image):
+    """Copies the image's pixels into a new shared memory block; returns (block, ref)."""
+    data = image.tobytes()
+    block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    block.buf[:len(data)] = data
+    info = {key: image.info[key] for key in ENCODER_INFO_KEYS if key in image.info}
+    return block, (block.name, len(data), image.mode, image.size, info)
+
+
+def attach_image(ref, unlink=False):
+    """Rebuilds an image from a shared block; unlink=True also frees the block."""
+    from PIL import Image
+    name, length, mode, size, info = ref
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        view = block.buf[:length]
+        try:
+            image = Image.frombytes(mode, size, view)
+        finally:
+            view.release()
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+    image.info.update(info)
+    return image
+
+
+# --- Run in the worker processes ---
+
+def _transcode(ref, plan):
+    return transcode(attach_image(ref), plan)
+
+
+def _encode_png(ref):
+    return encode_png(attach_image(ref))
+
+
+def encode_png(image):
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def open_upright(source):
+    """Decodes an encoded image (bytes or a file path) and applies its EXIF orientation.
+
+    Returns (image, warning), warning being the EXIF error if orientation failed.
+    """
+    from PIL import Image, ImageOps
+    image = Image.open(source if isinstance(source, str) else BytesIO(source))
+    image.load()
+    try:
+        return ImageOps.exif_transpose(image), None
+    except Exception as e:
+        return image, str(e)
+
+
+def _decode(source):
+    image, warning = open_upright(source)
+    if image.mode not in SHARED_MODES:
+        # Palette images are small; send them pickled, palette included
+        return "image", image, warning
+    block, ref = share_image(image)
+    block.close()
+    return "shared", ref, warning
+
+
+def _ready():
+    return os.getpid()
+
+
+class ImageWorkerPool:
+    """Runs CPU-heavy image work (encoding and decoding) in worker processes.
+
+    Pixels cross into the workers through shared memory blocks rather than
+    pickled copies, and decoded pixels come back the same way. The pool
+    starts on first use; images under min_pixels, unsupported modes, and a
+    pool that has broken or is disabled (max_workers=0) fall back to
+    running the same function in the calling thread. All methods block, so
+    call them from a worker thread (asyncio.to_thread), never the loop.
+    Pixel digests and perceptual hashes stay in-process: Pillow and hashlib
+    release the GIL for them, and the copy into shared memory costs more.
+    """
+
+    def __init__(self, max_workers=None, min_pixels=MIN_OFFLOAD_PIXELS):
+        if max_workers is None:
+            # Even one worker keeps GIL-bound encoders off the event loop's process
+            max_workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.max_workers = max_workers
+        self.min_pixels = min_pixels
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None and self.max_workers > 0:
+                # spawn: workers must not inherit the parent's threads and clipboard state
+                self.executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    def should_offload(self, image):
+        return (
+            self.max_workers > 0
+            and image is not None
+            and image.mode in SHARED_MODES
+            and image.size[0] * image.size[1] >= self.min_pixels
+        )
+
+    def warm_up(self):
+        """Starts the workers ahead of the first large image."""
+        executor = self.get_executor()
+        if executor is not None:
+            for future in [executor.submit(_ready) for _ in range(self.max_workers)]:
+                future.result()
+
+    def submit(self, func, *args):
+        """Runs func in a worker and returns its result; None if there is no working pool."""
+        executor = self.get_executor()
+        if executor is None:
+            return None
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            executor.shutdown(wait=False)
+            return None
+
+    def run_on_image(self, func, local, image, *args):
+        if not self.should_offload(image):
+            return local(image, *args)
+        block, ref = share_image(image)
+        try:
+            result = self.submit(func, ref, *args)
+        finally:
+            block.close()
+            block.unlink()
+        return local(image, *args) if result is None else result
+
+    def transcode(self, image, plan):
+        return self.run_on_image(_transcode, transcode, image, plan)
+
+    def encode_png(self, image):
+        return self.run_on_image(_encode_png, encode_png, image)
+
+    def should_offload_decode(self, source):
+        if self.max_workers <= 0:
+            return False
+        # Headers only; formats the probe does not know are offloaded as before
+        info = probe_image(source)
+        return info is None or info['width'] * info['height'] >= self.min_pixels
+
+    def decode(self, source):
+        """Decodes an encoded image (bytes or a file path); returns (image, EXIF warning or None)."""
+        result = self.submit(_decode, source) if self.should_offload_decode(source) else None
+        if result is None:
+            return open_upright(source)
+        kind, value, warning = result
+        return (attach_image(value, unlink=True) if kind == "shared" else value), warning
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
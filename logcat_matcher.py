@@ -0,0 +1,48 @@
+import re
+
+# (logcat tag, message fragment) pairs that indicate a copy action on the device
+DEFAULT_COPY_RULES = [
+    ("SemClipboardToastController", "Copy toast is shown"),
+    ("ClipboardListener", "showCopyToast"),
+    # Also listen for our own app's logs to confirm it saw the change
+    ("ClipboardMonitor", "Clipboard changed:"),
+]
+
+# Content digest our app appends to the change lines it logs for host writes
+EVENT_DIGEST = re.compile(r"digest=([0-9a-f]{32})")
+
+
+class LogcatEventMatcher:
+    """Precompiled matcher for copy-event log lines.
+
+    The rules are folded into one regex so each line is scanned once, and
+    the rule tags double as logcat filterspecs so the device only sends the
+    lines we care about.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(rules or DEFAULT_COPY_RULES)
+        pattern = "|".join(f"{re.escape(tag)}.*?{re.escape(message)}" for tag, message in self.rules)
+        self.regex = re.compile(pattern)
+
+    def tags(self):
+        seen = []
+        for tag, _ in self.rules:
+            if tag not in seen:
+                seen.append(tag)
+        return seen
+
+    def logcat_args(self):
+        """logcat filterspecs: every rule tag at verbose, everything else silent."""
+        return [f"{tag}:V" for tag in self.tags()] + ["*:S"]
+
+    def matches(self, line):
+        return self.regex.search(line) is not None
+
+    def event_digest(self, line):
+        """Content digest reported with a change event, or None for events without one."""
+        match = EVENT_DIGEST.search(line)
+        return match.group(1) if match else None
+
+
+default_matcher = LogcatEventMatcher()
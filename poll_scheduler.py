@@ -0,0 +1,106 @@
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows; child process CPU is then left out of the measurement
+    resource = None
+
+
+def children_cpu_time():
+    """CPU seconds used by finished child processes (e.g. pbpaste), or 0 where unsupported."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class AdaptivePollScheduler:
+    """Picks the host clipboard poll interval from recent activity and a CPU budget.
+
+    Polls run at min_interval while the user is active: for active_hold
+    seconds after a clipboard change or a device event. After that, each
+    poll with no change multiplies the interval by backoff, up to
+    max_interval. cpu_budget is the share of one core polling may use
+    (0.005 = 0.5%). The CPU time of polls that found nothing (the pure cost
+    of watching) is measured and smoothed. The interval never drops below
+    what keeps that cost within the budget, even while active, but never
+    goes above max_interval either: a backend without a change token pays
+    for a full read every poll and would otherwise be stretched to seconds
+    between polls. Polls that found a change also do sync work, so they do
+    not raise the floor. They do count in stats(), which reports the
+    interval and how much of the budget the last window actually used.
+    """
+
+    def __init__(self, min_interval=0.05, max_interval=1.0, backoff=1.5, active_hold=3.0, cpu_budget=0.005,
+                 smoothing=0.2, window=60.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.active_hold = active_hold
+        self.cpu_budget = cpu_budget
+        self.smoothing = smoothing
+        self.window = window
+        self.interval = min_interval
+        self.last_activity = time.monotonic()
+        # Smoothed CPU seconds per poll that found no change
+        self.cpu_per_poll = 0.0
+        self.polls = 0
+        self.idle_polls = 0
+        # (monotonic time, CPU seconds) per poll within the last window
+        self.recent = deque()
+
+    def activity(self):
+        """Records user activity (a clipboard change or device event); polling tightens straight away."""
+        self.last_activity = time.monotonic()
+        self.interval = self.min_interval
+
+    def record_poll(self, cpu_seconds, changed):
+        """Records one poll's CPU cost and whether it found a change; returns the next interval."""
+        now = time.monotonic()
+        self.polls += 1
+        if not changed:
+            if self.idle_polls == 0:
+                self.cpu_per_poll = cpu_seconds
+            else:
+                self.cpu_per_poll += self.smoothing * (cpu_seconds - self.cpu_per_poll)
+            self.idle_polls += 1
+        self.recent.append((now, cpu_seconds))
+        while self.recent and now - self.recent[0][0] > self.window:
+            self.recent.popleft()
+
+        if changed:
+            self.activity()
+        elif now - self.last_activity > self.active_hold:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.next_interval()
+
+    def budget_interval(self):
+        """Shortest interval at which the measured per-poll cost stays within the CPU budget."""
+        if not self.cpu_budget:
+            return 0.0
+        return self.cpu_per_poll / self.cpu_budget
+
+    def next_interval(self):
+        return min(self.max_interval, max(self.interval, self.budget_interval()))
+
+    def cpu_usage(self):
+        """Share of one core spent polling over the last window."""
+        if not self.recent:
+            return 0.0
+        span = max(time.monotonic() - self.recent[0][0], self.next_interval())
+        return sum(cpu for _, cpu in self.recent) / span
+
+    def stats(self):
+        usage = self.cpu_usage()
+        return {
+            "interval_s": round(self.next_interval(), 3),
+            "budget_interval_s": round(self.budget_interval(), 3),
+            "idle_s": round(time.monotonic() - self.last_activity, 1),
+            "cpu_per_poll_ms": round(self.cpu_per_poll * 1000, 3),
+            "cpu_usage": round(usage, 5),
+            "cpu_budget": self.cpu_budget,
+            "budget_used": round(usage / self.cpu_budget, 3) if self.cpu_budget else None,
+            "polls": self.polls,
+        }
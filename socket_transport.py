@@ -0,0 +1,337 @@
+import asyncio
+import os
+import secrets
+import struct
+import time
+
+import sync_clipboard as helpers
+from adb_session import AsyncAdbSessionPool
+from adb_transport import AdbTransport
+from image_fingerprint import BytesDigest, bytes_digest
+from sync_metrics import metrics
+from transport import Transport
+
+# Port SocketSyncService listens on (loopback only) on the device
+DEVICE_PORT = 47821
+SERVICE_COMPONENT = "com.example.clipboard/.SocketSyncService"
+
+# Frame: magic, kind, metadata length, payload length, then both blobs.
+# Must match SocketSyncService.
+FRAME_MAGIC = b"CSF1"
+FRAME_HEADER = struct.Struct(">4scIQ")
+KIND_HELLO = b"H"
+KIND_TEXT = b"T"
+KIND_IMAGE = b"I"
+KIND_ACK = b"A"
+MAX_META_BYTES = 64 * 1024
+
+
+def encode_frame(kind, meta=b"", payload=b""):
+    return FRAME_HEADER.pack(FRAME_MAGIC, kind, len(meta), len(payload)) + meta + payload
+
+
+async def read_frame_header(reader, max_payload=helpers.MAX_IMAGE_BYTES):
+    """Reads one frame up to its payload; returns (kind, meta, payload_length)."""
+    magic, kind, meta_length, payload_length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if magic != FRAME_MAGIC:
+        raise ValueError(f"bad frame magic {magic!r}")
+    if meta_length > MAX_META_BYTES or payload_length > max_payload:
+        raise ValueError(f"frame too large ({meta_length} + {payload_length} bytes)")
+    meta = await reader.readexactly(meta_length)
+    return kind, meta, payload_length
+
+
+class SocketTransport(Transport):
+    """Clipboard transfers over a persistent TCP stream to the app's SocketSyncService.
+
+    Each device gets one connection, reached through an `adb forward` by
+    default, carrying length-prefixed frames: writes are sent whole and
+    acknowledged with the digest the app stored, so there is no shell
+    quoting, no argument-length limit and no temp file on the device. The
+    app also pushes its own clipboard changes over the same stream, which
+    are handed to on_clipboard without a read round trip. Devices whose
+    service cannot be reached, and reads after a copy event, use the adb
+    fallback.
+
+    resolve_address(device) returns the (host, port) to connect to, e.g. a
+    device's LAN address when the service listens there.
+
+    The service only talks to connections whose hello carries token, a
+    random secret handed to it when it is started over adb, so other apps
+    on the phone cannot read or write the clipboard through it.
+    """
+
+    name = "socket"
+
+    def __init__(self, sessions=None, port=DEVICE_PORT, resolve_address=None, fallback=None, link_throughput=None,
+                 ack_timeout=10.0, connect_timeout=2.0, retry_interval=30.0, token=None):
+        super().__init__(link_throughput)
+        self.token = token or secrets.token_hex(16)
+        self.sessions = sessions or AsyncAdbSessionPool()
+        self.port = port
+        self.resolve_address = resolve_address or self.forward_port
+        self.fallback = fallback or AdbTransport(self.sessions, self.link_throughput)
+        self.ack_timeout = ack_timeout
+        self.connect_timeout = connect_timeout
+        # After a failed connect, devices use the fallback for this long
+        self.retry_interval = retry_interval
+        # device -> (reader, writer)
+        self.connections = {}
+        self.reader_tasks = {}
+        self.write_locks = {}
+        self.connect_locks = {}
+        # device -> future for the ack of the frame in flight
+        self.acks = {}
+        self.forwards = {}
+        self.retry_at = {}
+
+    @property
+    def on_write(self):
+        return self._on_write
+
+    @on_write.setter
+    def on_write(self, callback):
+        # The fallback reports its writes to the same place
+        self._on_write = callback
+        if getattr(self, "fallback", None) is not None:
+            self.fallback.on_write = callback
+
+    # --- Connections ---
+
+    async def forward_port(self, device):
+        """Starts the service and forwards a free host port to it; returns the local address."""
+        if device in self.forwards:
+            return "127.0.0.1", self.forwards[device]
+        result = await self.sessions.run(
+            device, f"am start-foreground-service -n {SERVICE_COMPONENT} --es token {self.token}", text=True
+        )
+        if result.returncode != 0 or "Error" in result.stdout:
+            raise RuntimeError(f"could not start the sync service: {result.stdout.strip()}")
+        metrics.count("subprocesses.adb", device=device)
+        process = await asyncio.create_subprocess_exec(
+            "adb", "-s", device, "forward", "tcp:0", f"tcp:{self.port}",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"adb forward exited with {process.returncode}")
+        local_port = int(stdout.decode().strip())
+        self.forwards[device] = local_port
+        return "127.0.0.1", local_port
+
+    async def remove_forward(self, device):
+        local_port = self.forwards.pop(device, None)
+        if local_port is None:
+            return
+        metrics.count("subprocesses.adb", device=device)
+        process = await asyncio.create_subprocess_exec(
+            "adb", "-s", device, "forward", "--remove", f"tcp:{local_port}",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        await process.wait()
+
+    async def attach(self, device):
+        await self.fallback.attach(device)
+        await self.connection(device)
+
+    async def connect(self, device, attempts=5):
+        """Opens the device connection; False (and adb fallback for a while) if it cannot."""
+        try:
+            host, port = await self.resolve_address(device)
+            for attempt in range(attempts):
+                writer = None
+                try:
+                    # With adb forward the connect succeeds even when nothing
+                    # listens on the device, so only the hello reply counts
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.connect_timeout)
+                    writer.write(encode_frame(KIND_HELLO, self.token.encode("ascii")))
+                    await writer.drain()
+                    kind, _, payload_length = await asyncio.wait_for(read_frame_header(reader, 0), self.connect_timeout)
+                    if kind == KIND_HELLO:
+                        break
+                except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    pass
+                if writer is not None:
+                    writer.close()
+                # The service may still be starting
+                await asyncio.sleep(0.2 * (attempt + 1))
+            else:
+                raise ConnectionError(f"no reply from {host}:{port}")
+        except Exception as e:
+            print(f"[{device}] Socket transport unavailable, using adb: {e}")
+            self.retry_at[device] = time.time() + self.retry_interval
+            await self.remove_forward(device)
+            return False
+
+        self.connections[device] = (reader, writer)
+        self.write_locks.setdefault(device, asyncio.Lock())
+        self.reader_tasks[device] = asyncio.create_task(self.read_frames(device, reader))
+        metrics.count("socket_connects", device=device)
+        print(f"[{device}] Connected to the sync service at {host}:{port}")
+        return True
+
+    async def connection(self, device):
+        """The open connection for device, reconnecting once the retry interval has passed."""
+        # attach and the first send can race to connect
+        async with self.connect_locks.setdefault(device, asyncio.Lock()):
+            if device in self.connections:
+                return self.connections[device]
+            if time.time() < self.retry_at.get(device, 0):
+                return None
+            if await self.connect(device):
+                return self.connections[device]
+            return None
+
+    def drop(self, device):
+        connection = self.connections.pop(device, None)
+        if connection is not None:
+            connection[1].close()
+        task = self.reader_tasks.pop(device, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        ack = self.acks.pop(device, None)
+        if ack is not None and not ack.done():
+            ack.set_exception(ConnectionError("connection closed"))
+
+    async def detach(self, device):
+        self.drop(device)
+        self.retry_at.pop(device, None)
+        await self.remove_forward(device)
+        await self.fallback.detach(device)
+
+    async def close_all(self):
+        for device in list(self.connections):
+            self.drop(device)
+        for device in list(self.forwards):
+            await self.remove_forward(device)
+        await self.fallback.close_all()
+
+    # --- Host to device ---
+
+    async def send_frame(self, device, kind, meta, payload):
+        """Writes one frame and waits for the app's ack; returns the digest it reports."""
+        connection = await self.connection(device)
+        if connection is None:
+            return None
+        writer = connection[1]
+        async with self.write_locks[device]:
+            ack = asyncio.get_running_loop().create_future()
+            self.acks[device] = ack
+            try:
+                writer.write(FRAME_HEADER.pack(FRAME_MAGIC, kind, len(meta), len(payload)))
+                writer.write(meta)
+                writer.write(payload)
+                await writer.drain()
+                return await asyncio.wait_for(ack, self.ack_timeout)
+            except BaseException:
+                # A frame cut short (cancelled, timed out or failed) leaves the
+                # stream unusable; the next send reconnects
+                self.drop(device)
+                self.retry_at.pop(device, None)
+                raise
+            finally:
+                if self.acks.get(device) is ack:
+                    del self.acks[device]
+
+    async def send_text(self, device, text):
+        payload = text.encode("utf-8")
+        if not helpers.clipboard_text_fits(device, payload):
+            return False
+        if await self.connection(device) is None:
+            return await self.fallback.send_text(device, text)
+        digest = bytes_digest(payload)
+        self.expect_write(device, digest)
+        with metrics.timer("socket_send", device, len(payload)):
+            acked = await self.send_frame(device, KIND_TEXT, b"", payload)
+        if acked != digest:
+            print(f"[{device}] Socket send of text not confirmed (ack: {acked})")
+            return False
+        print(f"[{device}] Sent text to Android: {text[:30]}..." if len(text) > 30 else f"[{device}] Sent text to Android: {text}")
+        return True
+
+    async def send_image(self, device, digest, encode):
+        if await self.connection(device) is None:
+            return await self.fallback.send_image(device, digest, encode)
+        encoded = await encode()
+        if encoded is None:
+            return False
+        plan, img_bytes = encoded
+        payload_digest = bytes_digest(img_bytes)
+        self.expect_write(device, payload_digest)
+        start = time.perf_counter()
+        with metrics.timer("socket_send", device, len(img_bytes)):
+            acked = await self.send_frame(device, KIND_IMAGE, f"{plan.mime_type}\n{plan.filename}".encode("utf-8"), img_bytes)
+        if acked != payload_digest:
+            print(f"[{device}] Socket send of image not confirmed (ack: {acked})")
+            return False
+        self.link_throughput.record(device, len(img_bytes), time.perf_counter() - start)
+        print(f"[{device}] Sent image to Android ({len(img_bytes)} bytes, {plan.format})")
+        return True
+
+    # --- Device to host ---
+
+    async def read_clipboard(self, device):
+        # The app can only read its clipboard from the foreground, which the
+        # read script arranges; changes it can see arrive via read_frames
+        return await self.fallback.read_clipboard(device)
+
+    async def read_frames(self, device, reader):
+        """Dispatches acks and device-pushed clipboard changes until the connection ends."""
+        try:
+            while True:
+                kind, meta, payload_length = await read_frame_header(reader)
+                if kind == KIND_ACK:
+                    payload = await reader.readexactly(payload_length)
+                    ack = self.acks.get(device)
+                    if ack is not None and not ack.done():
+                        ack.set_result(meta.decode("ascii", errors="replace"))
+                elif kind == KIND_TEXT:
+                    payload = await reader.readexactly(payload_length)
+                    metrics.count("socket_pushes", device=device)
+                    clipboard_data = helpers.clipboard_data_from_frame(device, "text", meta, payload)
+                    if clipboard_data is not None and self.on_clipboard is not None:
+                        self.on_clipboard(device, clipboard_data)
+                elif kind == KIND_IMAGE:
+                    metrics.count("socket_pushes", device=device)
+                    clipboard_data = await self.read_image_payload(device, reader, meta, payload_length)
+                    if self.on_clipboard is not None:
+                        self.on_clipboard(device, clipboard_data)
+                    elif clipboard_data.get('path'):
+                        os.unlink(clipboard_data['path'])
+                else:
+                    await reader.readexactly(payload_length)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.IncompleteReadError:
+            print(f"[{device}] Sync service closed the connection")
+        except Exception as e:
+            print(f"[{device}] Socket transport error: {e}")
+        if self.connections.get(device, (reader,))[0] is reader:
+            self.drop(device)
+
+    async def read_image_payload(self, device, reader, meta, payload_length):
+        """Reads a pushed image, inline when small and into a host temp file otherwise."""
+        clipboard_data = helpers.clipboard_data_from_frame(device, "image", meta, b"")
+        if payload_length <= helpers.INLINE_IMAGE_BYTES:
+            clipboard_data['data'] = await reader.readexactly(payload_length)
+            return clipboard_data
+
+        digest = BytesDigest()
+        remaining = payload_length
+        out = helpers.new_pull_file()
+        try:
+            while remaining:
+                chunk = await reader.readexactly(min(remaining, helpers.PULL_CHUNK_BYTES))
+                out.write(chunk)
+                digest.update(chunk)
+                remaining -= len(chunk)
+            out.close()
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
+        clipboard_data['data'] = None
+        clipboard_data['path'], clipboard_data['size'], clipboard_data['digest'] = out.name, payload_length, digest.hexdigest()
+        return clipboard_data
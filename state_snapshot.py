@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import time
+
+STATE_VERSION = 2
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "clipboard_sync", "state.json")
+
+
+class StateSnapshot:
+    """Small JSON file holding what the engine knew at the end of its last run.
+
+    Lets a restart skip the full clipboard probe and the per-device serial
+    lookups, and remember what each device already holds. Only digests,
+    change counts and serials are stored, never clipboard contents. A
+    missing, unreadable or older-format file loads as an empty state, as
+    does any file when fresh is set.
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH, fresh=False):
+        self.path = path
+        self.fresh = fresh
+        # Serialized form of the last save, so unchanged state is not rewritten
+        self.last_saved = None
+
+    def load(self):
+        if self.fresh:
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable state file {self.path}: {e}")
+            return {}
+        if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+            return {}
+        return state
+
+    def save(self, state, force=False):
+        """Writes state atomically; returns False if it was unchanged since the last save.
+
+        force writes it anyway, refreshing saved_at (e.g. at shutdown).
+        """
+        data = json.dumps(state, sort_keys=True)
+        if data == self.last_saved and not force:
+            return False
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".state-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(dict(state, version=STATE_VERSION, saved_at=time.time()), f, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.last_saved = data
+        return True
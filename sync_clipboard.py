@@ -1,19 +1,80 @@
-import time
+import argparse
+import importlib.util
+import asyncio
 import subprocess
 import shlex
-import pyperclip
 import sys
 import os
 import threading
 import queue
 import base64
+import struct
 import tempfile
-from PIL import ImageGrab, Image, ImageOps
-from io import BytesIO
+import zlib
 import urllib.parse
-
-# Global queue to communicate between threads
-clipboard_event_queue = queue.Queue()
+import posixpath
+from artifact_cache import ArtifactCache
+from device_blob_cache import DeviceBlobCache
+from image_fingerprint import bytes_digest, exact_digest
+from image_transcoder import LinkThroughput, TranscodePolicy
+from image_workers import ImageWorkerPool
+from logcat_matcher import default_matcher
+from poll_scheduler import AdaptivePollScheduler
+from state_snapshot import DEFAULT_STATE_PATH, StateSnapshot
+from sync_metrics import metrics
+
+# Global queue to communicate between threads; bounded, since one copy can
+# log several matching lines and a stalled consumer must not grow it forever
+clipboard_event_queue = queue.Queue(maxsize=32)
+
+# The blocking send/read helpers below run on one shared AdbTransport, driven
+# by a background event loop so its adb shell sessions outlive each call
+helper_loop = None
+helper_transport = None
+helper_lock = threading.Lock()
+
+# Encoded forms of recent clipboard images, keyed by pixel digest, so each
+# encoding happens once per clipboard change rather than once per device
+image_artifacts = ArtifactCache()
+
+# Encoding and decoding of large images run in worker processes
+image_workers = ImageWorkerPool()
+
+# How host images are encoded for each transfer, and the measured push rate
+# per device that the choice depends on
+transcode_policy = TranscodePolicy()
+link_throughput = LinkThroughput()
+
+# App-specific storage on the device that both sides can read and write
+DEVICE_FILES_DIR = "/sdcard/Android/data/com.example.clipboard/files"
+
+# "binary" streams raw image bytes with a small header; "base64" is the legacy
+# text-file format understood by older builds of the Android app
+IMAGE_TRANSFER_MODE = "binary"
+IMAGE_HEADER_MAGIC = b"CSB1"
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+
+# Pushed images are kept on the device under their content digest so a
+# recent image can be re-installed with just a broadcast
+BLOB_DIR = f"{DEVICE_FILES_DIR}/blobs"
+BLOB_MISS_MARKER = "CSB_MISS"
+device_blobs = DeviceBlobCache()
+
+# Texts whose quoted broadcast command is above this many bytes are gzipped
+# and streamed into a device file instead, since the command line hits the
+# shell's argument size limit (128 KiB) and the intent size limit
+LARGE_TEXT_BYTES = 64 * 1024
+# setPrimaryClip hands the text (as UTF-16) to the clipboard service in one
+# binder transaction of at most 1 MB, so larger texts never reach the clipboard
+MAX_CLIPBOARD_TEXT_BYTES = 256 * 1024
+TEXT_PUSH_PATH = f"{DEVICE_FILES_DIR}/clipboard_text_from_mac.gz"
+TEXT_CHUNK_BYTES = 256 * 1024
+
+# Images from the device up to this size come back inline in the read
+# response; larger ones are streamed to a host temp file in chunks
+INLINE_IMAGE_BYTES = 1024 * 1024
+DEVICE_IMAGE_PATH = f"{DEVICE_FILES_DIR}/clipboard_image.bin"
+PULL_CHUNK_BYTES = 1024 * 1024
 
 def get_connected_devices():
     """Returns a list of unique connected device IDs."""
@@ -52,160 +113,299 @@ def get_connected_devices():
     except subprocess.CalledProcessError:
         return []
 
-def send_text_to_device(device_id, text):
-    """Sends text to a specific Android device via ADB broadcast using stdin."""
+def build_text_broadcast(text):
+    """Builds the shell command that hands text to WriteReceiver."""
     quoted_text = shlex.quote(text)
-    cmd_str = f"am broadcast -a com.example.clipboard.WRITE -n com.example.clipboard/.WriteReceiver -e text {quoted_text}"
-    
+    return f"am broadcast -a com.example.clipboard.WRITE -n com.example.clipboard/.WriteReceiver -e text {quoted_text}"
+
+def build_text_file_broadcast(push_path):
+    """Builds the shell command that points WriteReceiver at a pushed gzip text file."""
+    return f'am broadcast -a com.example.clipboard.WRITE -n com.example.clipboard/.WriteReceiver -e text_gz "{push_path}"'
+
+def clipboard_text_fits(device_id, text_bytes):
+    """False, with a warning, if the text is too large for the Android clipboard."""
+    if len(text_bytes) <= MAX_CLIPBOARD_TEXT_BYTES:
+        return True
+    metrics.count("texts_too_large", device=device_id)
+    print(f"[{device_id}] Text too large for the Android clipboard ({len(text_bytes)} bytes), skipping")
+    return False
+
+def iter_compressed_text(data, chunk_bytes=TEXT_CHUNK_BYTES):
+    """Yields the gzip stream of data a chunk at a time, so large texts are never compressed in one piece."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_bytes):
+        compressed = compressor.compress(view[start:start + chunk_bytes])
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def build_image_broadcast(extra, push_path, keep_blob=False):
+    """Builds the shell command that points WriteReceiver at a pushed image file."""
+    cmd = f'am broadcast -a com.example.clipboard.WRITE -n com.example.clipboard/.WriteReceiver -e {extra} "{push_path}"'
+    if keep_blob:
+        # WriteReceiver keeps the file in its blob cache instead of deleting it
+        cmd += " --ez keep_blob true"
+    return cmd
+
+def blob_path(img_bytes):
+    """Device path of the blob holding this exact payload."""
+    return f"{BLOB_DIR}/{bytes_digest(img_bytes)}.bin"
+
+def blob_digest(push_path):
+    """Payload digest a blob is named by; the app reports the same digest when it installs it."""
+    return posixpath.splitext(posixpath.basename(push_path))[0]
+
+def build_blob_install_command(push_path):
+    """Shell command that re-installs a cached blob, or prints BLOB_MISS_MARKER if it was evicted."""
+    return (
+        f'if [ -f "{push_path}" ]; then touch "{push_path}"; {build_image_broadcast("image_bin", push_path, keep_blob=True)}; '
+        f'else echo {BLOB_MISS_MARKER}; fi'
+    )
+
+def shared_adb_transport():
+    """The AdbTransport the blocking helpers use, started with its event loop on first use."""
+    global helper_loop, helper_transport
+    with helper_lock:
+        if helper_transport is None:
+            # Imported here: adb_transport builds on the helpers in this module
+            from adb_transport import AdbTransport
+            helper_loop = asyncio.new_event_loop()
+            threading.Thread(target=helper_loop.run_forever, name="adb-helpers", daemon=True).start()
+            helper_transport = AdbTransport()
+        return helper_transport
+
+def run_adb(call, timeout=60):
+    """Runs call(transport)'s coroutine on the helper loop and blocks until it finishes."""
+    transport = shared_adb_transport()
+    return asyncio.run_coroutine_threadsafe(asyncio.wait_for(call(transport), timeout), helper_loop).result()
+
+def close_adb_sessions():
+    """Closes the helpers' adb shell sessions; the next call opens fresh ones."""
+    if helper_transport is not None:
+        run_adb(lambda transport: transport.close_all())
+
+def send_text_to_device(device_id, text, large_text_bytes=None):
+    """Sends text to a specific Android device via ADB broadcast over its shell session."""
     try:
-        process = subprocess.Popen(
-            ["adb", "-s", device_id, "shell"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = process.communicate(input=cmd_str)
-        
-        if process.returncode == 0:
-            if "Error" in stderr or "inaccessible" in stderr:
-                 print(f"[{device_id}] Potential error sending text: {stderr.strip()}")
-            else:
-                 print(f"[{device_id}] Sent text to Android: {text[:30]}..." if len(text) > 30 else f"[{device_id}] Sent text to Android: {text}")
-        else:
-            print(f"[{device_id}] ADB failed sending text: {stderr.strip()}")
-            
+        return run_adb(lambda transport: transport.send_text(device_id, text, large_text_bytes))
     except Exception as e:
         print(f"[{device_id}] Exception during text send: {e}")
+        return False
 
-def send_image_to_device(device_id, image):
-    """Sends image to a specific Android device via ADB broadcast."""
+def build_image_header(mime_type, filename, payload_length):
+    """Builds the binary image header read by WriteReceiver with a DataInputStream."""
+    mime_bytes = mime_type.encode('utf-8')
+    name_bytes = filename.encode('utf-8')
+    return (
+        IMAGE_HEADER_MAGIC
+        + struct.pack(">H", len(mime_bytes)) + mime_bytes
+        + struct.pack(">H", len(name_bytes)) + name_bytes
+        + struct.pack(">q", payload_length)
+    )
+
+def image_push_command(device_id, push_path):
+    """adb command that writes its stdin to push_path on the device, byte for byte."""
+    return ["adb", "-s", device_id, "exec-in", f"mkdir -p {posixpath.dirname(push_path)} && cat > {push_path}"]
+
+def push_image_base64(device_id, img_bytes, plan, digest=None):
+    """Pushes the image as a Base64 text file (legacy format)."""
+    # Cached per plan: devices on different links get different bytes for the same image
+    base64_image = image_artifacts.get_or_create(
+        digest, f"base64:{plan.key()}", lambda: base64.b64encode(img_bytes).decode('utf-8')
+    )
+    
+    # Create a temp file with image data
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as temp_file:
+        temp_file.write(f"{plan.mime_type}\n")
+        temp_file.write(f"{plan.filename}\n")
+        temp_file.write(base64_image)
+        temp_path = temp_file.name
+    
     try:
-        # Convert image to PNG bytes
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_bytes = img_byte_arr.getvalue()
-        
-        # Check size limit (50MB)
-        if len(img_bytes) > 50 * 1024 * 1024:
-            print(f"[{device_id}] Image too large ({len(img_bytes)} bytes), skipping")
-            return
-        
-        # Encode to Base64
-        base64_image = base64.b64encode(img_bytes).decode('utf-8')
-        
-        # Create a temp file with image data
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as temp_file:
-            temp_file.write(f"image/png\n")
-            temp_file.write(f"clipboard_image.png\n")
-            temp_file.write(base64_image)
-            temp_path = temp_file.name
-        
-        try:
-            # Push the file to device in a location WriteReceiver can read (app-specific storage)
-            push_path = "/sdcard/Android/data/com.example.clipboard/files/clipboard_image_from_mac.txt"
+        # Push the file to device in a location WriteReceiver can read (app-specific storage)
+        push_path = f"{DEVICE_FILES_DIR}/clipboard_image_from_mac.txt"
+        metrics.count("subprocesses.adb", device=device_id)
+        with metrics.timer("adb_push", device_id, len(base64_image)):
             subprocess.run(
                 ["adb", "-s", device_id, "push", temp_path, push_path],
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
-                check=True
-            )
-            
-            # Broadcast with just the file path - WriteReceiver will read the file
-            cmd = f'am broadcast -a com.example.clipboard.WRITE -n com.example.clipboard/.WriteReceiver -e image_file "{push_path}"'
-            
-            result = subprocess.run(
-                ["adb", "-s", device_id, "shell", cmd],
-                capture_output=True,
-                text=True,
-                timeout=10
+                check=True,
+                timeout=30
             )
-            
-            if result.returncode == 0:
-                print(f"[{device_id}] Sent image to Android ({len(img_bytes)} bytes)")
-            else:
-                print(f"[{device_id}] Failed to send image broadcast: {result.stderr}")
-                
-        finally:
-            os.unlink(temp_path)
-            
-    except subprocess.TimeoutExpired:
+        return push_path
+    finally:
+        os.unlink(temp_path)
+
+@metrics.timed("png_encode")
+def encode_image_png(image):
+    """Encodes a PIL image to PNG bytes."""
+    return image_workers.encode_png(image)
+
+def encode_image_png_cached(image, digest=None):
+    """PNG bytes for the image, encoded at most once per distinct image content."""
+    if digest is None:
+        digest = compute_image_hash(image)
+    return image_artifacts.get_or_create(digest, "png", lambda: encode_image_png(image))
+
+def encode_image_for_transfer(image, digest, throughput, policy=None):
+    """Picks an encoding for a link of the given throughput and returns (plan, bytes).
+
+    The bytes for each distinct plan are cached with the image, so devices
+    on similar links share one encode.
+    """
+    png_bytes = image_artifacts.get(digest, "png") if digest is not None else None
+    plan = (policy or transcode_policy).choose(image, throughput, len(png_bytes) if png_bytes is not None else None)
+    if plan.lossless:
+        return plan, encode_image_png_cached(image, digest)
+    with metrics.timer("transcode"):
+        return plan, image_artifacts.get_or_create(digest, plan.key(), lambda: image_workers.transcode(image, plan))
+
+def record_image_transfer(device_id, plan, image, img_bytes, throughput):
+    """Logs the encoding chosen for one transfer so the policy can be tuned."""
+    metrics.count(f"transcode_{plan.format.lower()}", device=device_id)
+    metrics.record("image_transfers", {
+        "device": device_id,
+        "width": image.size[0],
+        "height": image.size[1],
+        "bytes": len(img_bytes),
+        "throughput_bps": round(throughput),
+        **plan.to_dict(),
+    })
+
+def prepare_image_transfer(device_id, image, digest, throughput, policy=None):
+    """Encodes the image for one device's link; returns (plan, bytes), or None if it is too large to send."""
+    plan, img_bytes = encode_image_for_transfer(image, digest, throughput, policy)
+    if len(img_bytes) > MAX_IMAGE_BYTES:
+        print(f"[{device_id}] Image too large ({len(img_bytes)} bytes), skipping")
+        return None
+    record_image_transfer(device_id, plan, image, img_bytes, throughput)
+    return plan, img_bytes
+
+def send_image_to_device(device_id, image, digest=None):
+    """Sends image to a specific Android device via ADB broadcast."""
+    try:
+        if digest is None:
+            digest = compute_image_hash(image)
+        throughput = link_throughput.get(device_id)
+        encode = lambda: asyncio.to_thread(prepare_image_transfer, device_id, image, digest, throughput)
+        return run_adb(lambda transport: transport.send_image(device_id, digest, encode))
+    except (asyncio.TimeoutError, subprocess.TimeoutExpired):
         print(f"[{device_id}] Timeout sending image")
+        return False
     except Exception as e:
         print(f"[{device_id}] Exception during image send: {e}")
-    except Exception as e:
-        print(f"[{device_id}] Exception during image send: {e}")
+        return False
+
+# Device-side script for a single round-trip clipboard read: trigger the app,
+# wait on the device until it has written the clipboard, then emit one framed
+# response "CSR1 <status> <meta length> <payload length>\n<meta><payload>".
+# Images over the inline limit are answered with status image_file and no
+# payload; the host then streams clipboard_image.bin separately.
+READ_CLIPBOARD_SCRIPT = """
+D={files_dir}
+rm -f $D/clipboard_content.txt $D/clipboard_image_meta.txt $D/clipboard_image.bin $D/clipboard_ready.txt
+am start -n com.example.clipboard/.MainActivity >/dev/null 2>&1
+i=0
+# Only the ready marker means the app has finished writing; content found
+# without it after the timeout is from app builds that predate the marker
+while [ $i -lt {wait_steps} ] && [ ! -f $D/clipboard_ready.txt ]; do
+  sleep 0.1
+  i=$((i+1))
+done
+if [ -f $D/clipboard_image_meta.txt ] && [ -f $D/clipboard_image.bin ]; then
+  n=$(wc -c < $D/clipboard_image.bin)
+  if [ $n -le {inline_limit} ]; then
+    echo "CSR1 image $(wc -c < $D/clipboard_image_meta.txt) $n"
+    cat $D/clipboard_image_meta.txt $D/clipboard_image.bin
+  else
+    echo "CSR1 image_file $(wc -c < $D/clipboard_image_meta.txt) 0"
+    cat $D/clipboard_image_meta.txt
+  fi
+elif [ -s $D/clipboard_content.txt ]; then
+  echo "CSR1 text 0 $(wc -c < $D/clipboard_content.txt)"
+  cat $D/clipboard_content.txt
+elif [ -f $D/clipboard_ready.txt ]; then
+  echo "CSR1 empty 0 0"
+else
+  echo "CSR1 timeout 0 0"
+fi
+"""
+
+def parse_read_response(output):
+    """Parses a framed read response into (status, meta bytes, payload bytes)."""
+    newline = output.find(b"\n")
+    if newline == -1:
+        return "error", b"", b""
+    header = output[:newline].split()
+    if len(header) != 4 or header[0] != b"CSR1":
+        return "error", b"", b""
+    status = header[1].decode("ascii", errors="replace")
+    meta_length, payload_length = int(header[2]), int(header[3])
+    body = output[newline + 1:]
+    if len(body) < meta_length + payload_length:
+        return "truncated", b"", b""
+    return status, body[:meta_length], body[meta_length:meta_length + payload_length]
+
+def build_read_script(wait_timeout=5, inline_limit=INLINE_IMAGE_BYTES):
+    return READ_CLIPBOARD_SCRIPT.format(
+        files_dir=DEVICE_FILES_DIR, wait_steps=int(wait_timeout * 10), inline_limit=inline_limit
+    )
+
+def clipboard_data_from_frame(device_id, status, meta, payload):
+    """Turns a parsed read response into the clipboard data dict, or None."""
+    if status in ("image", "image_file"):
+        lines = meta.decode("utf-8", errors="replace").strip().split('\n', 1)
+        mime_type = lines[0]
+        filename = lines[1] if len(lines) > 1 else "image"
+        if status == "image_file":
+            # Too large to inline; the caller streams it with pull_image_file()
+            return {'type': 'image', 'mime_type': mime_type, 'filename': filename, 'data': None,
+                    'remote_path': DEVICE_IMAGE_PATH}
+        return {'type': 'image', 'mime_type': mime_type, 'filename': filename, 'data': payload}
+    
+    if status == "text":
+        text = payload.decode("utf-8", errors="replace")
+        if text.strip():
+            return {'type': 'text', 'data': text}
+        status = "empty"
+    
+    if status == "timeout":
+        print(f"[{device_id}] Timed out waiting for clipboard data")
+    else:
+        print(f"[{device_id}] No clipboard data read (status: {status})")
+    return None
+
+def image_pull_command(device_id, remote_path):
+    """adb command that writes a device file to its stdout, byte for byte."""
+    return ["adb", "-s", device_id, "exec-out", f"cat {remote_path}"]
+
+def new_pull_file():
+    return tempfile.NamedTemporaryFile(prefix="clipboard_from_android_", suffix=".bin", delete=False)
 
 def read_from_device(device_id):
     """Reads clipboard content (text or image) from a specific Android device."""
     try:
-        # Step 0: Clean up old files to avoid stale data
-        subprocess.run(["adb", "-s", device_id, "shell", "rm", "/sdcard/Android/data/com.example.clipboard/files/clipboard_content.txt"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(["adb", "-s", device_id, "shell", "rm", "/sdcard/Android/data/com.example.clipboard/files/clipboard_image_meta.txt"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(["adb", "-s", device_id, "shell", "rm", "/sdcard/Android/data/com.example.clipboard/files/clipboard_image.bin"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        # Step 1: Trigger the app to write clipboard to file
-        trigger_cmd = ["adb", "-s", device_id, "shell", "am", "start", "-n", "com.example.clipboard/.MainActivity"]
-        subprocess.run(trigger_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
-        
-        # Step 2: Poll for files (wait up to 5 seconds)
-        start_time = time.time()
-        while time.time() - start_time < 5:
-            # Check for image metadata
-            read_meta_cmd = ["adb", "-s", device_id, "shell", "cat", "/sdcard/Android/data/com.example.clipboard/files/clipboard_image_meta.txt"]
-            result_meta = subprocess.run(read_meta_cmd, capture_output=True, text=True, check=False)
-            
-            if result_meta.returncode == 0 and result_meta.stdout.strip():
-                # Found image metadata!
-                lines = result_meta.stdout.strip().split('\n', 1)
-                if len(lines) >= 1:
-                    mime_type = lines[0]
-                    filename = lines[1] if len(lines) > 1 else "image"
-                    
-                    # Pull the image file
-                    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                        temp_path = temp_file.name
-                    
-                    pull_cmd = ["adb", "-s", device_id, "pull", "/sdcard/Android/data/com.example.clipboard/files/clipboard_image.bin", temp_path]
-                    subprocess.run(pull_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                    
-                    # Read image data from temp file
-                    with open(temp_path, "rb") as f:
-                        image_data = f.read()
-                    
-                    # Clean up temp file
-                    os.unlink(temp_path)
-                    
-                    return {'type': 'image', 'mime_type': mime_type, 'filename': filename, 'data': image_data}
-            
-            # Check for text
-            read_txt_cmd = ["adb", "-s", device_id, "shell", "cat", "/sdcard/Android/data/com.example.clipboard/files/clipboard_content.txt"]
-            result_txt = subprocess.run(read_txt_cmd, capture_output=True, text=True, check=False)
-            
-            if result_txt.returncode == 0 and result_txt.stdout.strip():
-                return {'type': 'text', 'data': result_txt.stdout}
-            
-            # Wait a bit before retrying
-            time.sleep(0.2)
-        
-        print(f"[{device_id}] Timed out waiting for clipboard data")
-        return None
-        
+        return run_adb(lambda transport: transport.read_clipboard(device_id), timeout=120)
     except Exception as e:
         print(f"[{device_id}] Exception during read: {e}")
         return None
 
-def set_mac_clipboard_image(image):
+@metrics.timed("host_clipboard_write")
+def set_mac_clipboard_image(image, digest=None):
     """Sets an image to the Mac clipboard using osascript."""
     try:
-        # Save image to temporary file
+        # Save image to temporary file, reusing the PNG if it was already encoded
+        png_bytes = encode_image_png_cached(image, digest)
         with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-            image.save(temp_file, format='PNG')
+            temp_file.write(png_bytes)
             temp_path = temp_file.name
         
         try:
             # Use osascript to set clipboard
             script = f'set the clipboard to (read (POSIX file "{temp_path}") as «class PNGf»)'
+            metrics.count("subprocesses.osascript")
             subprocess.run(
                 ["osascript", "-e", script],
                 check=True,
@@ -214,8 +414,7 @@ def set_mac_clipboard_image(image):
             print(f"Image set to Mac clipboard")
             return True
         finally:
-            # Clean up temp file after a delay (osascript needs time to read it)
-            time.sleep(0.5)
+            # osascript has read the file into the pasteboard by the time it exits
             try:
                 os.unlink(temp_path)
             except:
@@ -225,6 +424,26 @@ def set_mac_clipboard_image(image):
         print(f"Error setting Mac clipboard image: {e}")
         return False
 
+# AppleScript pasteboard classes for encoded files that can be handed over as-is
+PASTEBOARD_CLASSES = {"PNG": "«class PNGf»", "JPEG": "JPEG picture"}
+
+@metrics.timed("host_clipboard_write")
+def set_mac_clipboard_image_file(path, image_format):
+    """Puts an encoded PNG/JPEG file on the Mac clipboard without decoding it."""
+    try:
+        script = f'set the clipboard to (read (POSIX file "{path}") as {PASTEBOARD_CLASSES[image_format]})'
+        metrics.count("subprocesses.osascript")
+        subprocess.run(
+            ["osascript", "-e", script],
+            check=True,
+            capture_output=True
+        )
+        print(f"Image set to Mac clipboard ({image_format} passthrough)")
+        return True
+    except Exception as e:
+        print(f"Error setting Mac clipboard image: {e}")
+        return False
+
 def get_finder_selection():
     """Gets the path of the currently selected file in Finder using AppleScript."""
     try:
@@ -237,6 +456,7 @@ def get_finder_selection():
             end if
         end tell
         """
+        metrics.count("subprocesses.osascript")
         result = subprocess.run(["osascript", "-e", cmd], capture_output=True, text=True)
         if result.returncode == 0 and result.stdout.strip():
             return result.stdout.strip()
@@ -244,8 +464,12 @@ def get_finder_selection():
         pass
     return None
 
+@metrics.timed("clipboard_probe")
 def get_mac_clipboard_image():
     """Gets an image from the Mac clipboard using PIL or Finder selection."""
+    # Imported on first use so startup does not pay for PIL
+    import pyperclip
+    from PIL import ImageGrab, Image
     try:
         content = ImageGrab.grabclipboard()
         text_content = ""
@@ -296,6 +520,7 @@ def get_mac_clipboard_image():
         # Also try to get clipboard as text via osascript if pyperclip failed or just to be safe
         try:
             cmd = 'osascript -e "get the clipboard as text"'
+            metrics.count("subprocesses.osascript")
             result = subprocess.run(shlex.split(cmd), capture_output=True, text=True)
             if result.returncode == 0 and result.stdout.strip():
                 potential_urls.append(result.stdout.strip())
@@ -324,6 +549,7 @@ def get_mac_clipboard_image():
         try:
             # Get the POSIX path of the file URL directly
             cmd = 'osascript -e "get POSIX path of (the clipboard as «class furl»)"'
+            metrics.count("subprocesses.osascript")
             result = subprocess.run(shlex.split(cmd), capture_output=True, text=True)
             if result.returncode == 0 and result.stdout.strip():
                 furl_path = result.stdout.strip()
@@ -345,12 +571,20 @@ def get_mac_clipboard_image():
         print(f"Error getting Mac clipboard image: {e}")
         return None
 
+def logcat_command(device_id, matcher=None):
+    """logcat command that only streams the tags the matcher cares about."""
+    return ["adb", "-s", device_id, "logcat", "-v", "time"] + (matcher or default_matcher).logcat_args()
+
 class LogcatMonitor(threading.Thread):
-    def __init__(self, device_id):
+    def __init__(self, device_id, matcher=None):
         super().__init__()
         self.device_id = device_id
         self.daemon = True
         self.stop_event = threading.Event()
+        self.matcher = matcher or default_matcher
+        # Counters to check how much the device-side filter saves
+        self.lines_read = 0
+        self.events_matched = 0
 
     def run(self):
         print(f"[{self.device_id}] Starting Logcat Monitor...")
@@ -358,7 +592,7 @@ class LogcatMonitor(threading.Thread):
         subprocess.run(["adb", "-s", self.device_id, "logcat", "-c"], stderr=subprocess.DEVNULL)
         
         process = subprocess.Popen(
-            ["adb", "-s", self.device_id, "logcat", "-v", "time"],
+            logcat_command(self.device_id, self.matcher),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -371,195 +605,126 @@ class LogcatMonitor(threading.Thread):
                 if not line:
                     break
                 
-                # Check for specific keywords indicating a copy action
-                if "SemClipboardToastController" in line and "Copy toast is shown" in line:
-                    clipboard_event_queue.put(self.device_id)
-                elif "ClipboardListener" in line and "showCopyToast" in line:
-                    clipboard_event_queue.put(self.device_id)
-                # Also listen for our own app's logs to confirm it saw the change
-                elif "ClipboardMonitor" in line and "Clipboard changed:" in line:
-                    clipboard_event_queue.put(self.device_id)
+                self.lines_read += 1
+                if self.matcher.matches(line):
+                    self.events_matched += 1
+                    try:
+                        clipboard_event_queue.put_nowait(self.device_id)
+                    except queue.Full:
+                        # The consumer already has plenty of reads queued for this state
+                        metrics.count("receive_dropped", device=self.device_id)
                     
         except Exception as e:
             print(f"[{self.device_id}] Logcat monitor error: {e}")
         finally:
             process.terminate()
 
+@metrics.timed("image_hash")
 def compute_image_hash(image):
-    """Compute a simple hash of an image for comparison."""
+    """Compute a stable digest of the image's pixels for comparison."""
     if image is None:
         return None
     try:
-        # Convert to bytes and hash
-        img_byte_arr = BytesIO()
-        # Resize to small size for quick comparison
-        thumb = image.copy()
-        thumb.thumbnail((64, 64))
-        thumb.save(img_byte_arr, format='PNG')
-        return hash(img_byte_arr.getvalue())
+        return exact_digest(image)
     except:
         return None
 
-def main():
+@metrics.timed("image_decode")
+def decode_received_image(source, device_id=""):
+    """Loads an image received from Android (bytes or a file path) and applies its EXIF orientation."""
+    # Decoded in full before returning, the pulled file may be removed once we return
+    image, warning = image_workers.decode(source)
+    if warning:
+        print(f"[{device_id}] Warning: Could not apply EXIF orientation: {warning}")
+    return image
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Two-way clipboard sync between a Mac and Android devices over ADB.")
+    parser.add_argument("--metrics-port", type=int, help="serve per-stage timing metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-dump", metavar="PATH", help="periodically write the metrics snapshot to PATH as JSON")
+    parser.add_argument("--metrics-interval", type=float, default=60, help="seconds between metrics dumps (default: 60)")
+    parser.add_argument("--near-duplicate-threshold", type=int, metavar="BITS",
+                        help="skip images whose perceptual hash is within BITS of the last synced image")
+    parser.add_argument("--image-max-dimension", type=int, default=2560, metavar="PX",
+                        help="downscale large images sent to devices to at most PX on the long side (default: 2560)")
+    parser.add_argument("--image-target-seconds", type=float, default=0.5,
+                        help="re-encode images lossily when a lossless push would take longer (default: 0.5)")
+    parser.add_argument("--lossless-images", action="store_true", help="always send images as full-size PNG")
+    parser.add_argument("--poll-min-interval", type=float, default=0.05, metavar="SECONDS",
+                        help="host clipboard poll interval right after activity (default: 0.05)")
+    parser.add_argument("--poll-max-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="poll interval the watcher backs off to when idle (default: 1.0)")
+    parser.add_argument("--poll-cpu-budget", type=float, default=0.5, metavar="PERCENT",
+                        help="share of one CPU core host clipboard polling may use (default: 0.5)")
+    parser.add_argument("--image-workers", type=int, metavar="N",
+                        help="worker processes for encoding and decoding large images "
+                             "(default: CPU count - 1, between 1 and 4; 0 runs them in threads)")
+    parser.add_argument("--large-text-threshold", type=int, default=LARGE_TEXT_BYTES, metavar="BYTES",
+                        help="gzip and stream texts whose broadcast command is larger than BYTES to devices "
+                             f"through a file instead of the command line (default: {LARGE_TEXT_BYTES})")
+    parser.add_argument("--transport", choices=["adb", "socket"], default="adb",
+                        help="adb: shell commands and pushes; socket: framed stream to the app's sync service, "
+                             "falling back to adb per device (default: adb)")
+    parser.add_argument("--socket-port", type=int, default=47821,
+                        help="port the app's sync service listens on (default: 47821)")
+    parser.add_argument("--state-file", default=DEFAULT_STATE_PATH, metavar="PATH",
+                        help="where to keep state between runs for a fast restart; an empty PATH disables it "
+                             f"(default: {DEFAULT_STATE_PATH})")
+    parser.add_argument("--fresh-start", action="store_true",
+                        help="ignore the saved state on this start (it is still saved for the next one)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("Two-way Clipboard Sync Started (Mac <-> Android)...")
     print("Text and Image support enabled.")
     print("Ensure 'Clipboard Sync' app is installed on Android device.")
     
-    # Install Pillow if not available
-    try:
-        import PIL
-    except ImportError:
+    # Install Pillow if not available; find_spec looks without importing it
+    if importlib.util.find_spec("PIL") is None:
         print("Installing Pillow...")
         subprocess.run([sys.executable, "-m", "pip", "install", "Pillow"], check=True)
         print("Pillow installed. Please restart the script.")
         return
     
-    last_mac_text = ""
-    last_android_clipboard = ""
-    last_mac_image_hash = None
-    last_android_image_hash = None
+    # Set on the imported module, not globals(): run as a script this is
+    # __main__, while the engine and transports use `import sync_clipboard`
+    import sync_clipboard
+    sync_clipboard.image_workers = ImageWorkerPool(args.image_workers)
     
-    # Initialize last_mac_text
-    try:
-        last_mac_text = pyperclip.paste()
-    except:
-        pass
+    policy = TranscodePolicy(
+        target_seconds=args.image_target_seconds,
+        max_dimension=args.image_max_dimension or None,
+        lossless_only=args.lossless_images
+    )
+    
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.metrics_dump:
+        metrics.start_dump(args.metrics_dump, args.metrics_interval)
+    
+    # Imported here: the engine and transports build on the helpers in this module
+    from adb_transport import AdbTransport
+    from sync_engine import SyncEngine
+    poll_scheduler = AdaptivePollScheduler(
+        min_interval=args.poll_min_interval,
+        max_interval=max(args.poll_min_interval, args.poll_max_interval),
+        cpu_budget=args.poll_cpu_budget / 100
+    )
+    transport = AdbTransport(large_text_bytes=args.large_text_threshold)
+    if args.transport == "socket":
+        from socket_transport import SocketTransport
+        transport = SocketTransport(transport.sessions, port=args.socket_port, fallback=transport,
+                                    link_throughput=transport.link_throughput)
+    
+    state_snapshot = StateSnapshot(args.state_file, fresh=args.fresh_start) if args.state_file else None
     
-    # Initialize last_mac_image_hash
-    last_mac_image_hash = compute_image_hash(get_mac_clipboard_image())
-
-    # Start logcat monitors for connected devices
-    devices = get_connected_devices()
-    monitors = {}
-    for device in devices:
-        monitor = LogcatMonitor(device)
-        monitor.start()
-        monitors[device] = monitor
-
-    # Track last send time to avoid feedback loops
-    last_send_time = {}
-    # Track last read time globally to debounce rapid events across duplicate device entries
-    last_global_read_time = 0
-
     try:
-        while True:
-            # Check for new devices or disconnected devices (basic handling)
-            current_devices = get_connected_devices()
-            for device in current_devices:
-                if device not in monitors:
-                    monitor = LogcatMonitor(device)
-                    monitor.start()
-                    monitors[device] = monitor
-            
-            # --- Mac to Android ---
-            # --- Mac to Android ---
-            
-            # Check for image changes FIRST
-            current_mac_image = get_mac_clipboard_image()
-            current_mac_image_hash = compute_image_hash(current_mac_image)
-            image_sent = False
-            
-            if current_mac_image_hash is not None and current_mac_image_hash != last_mac_image_hash:
-                # New image in clipboard
-                for device in current_devices:
-                    send_image_to_device(device, current_mac_image)
-                    last_send_time[device] = time.time()
-                last_mac_image_hash = current_mac_image_hash
-                image_sent = True
-
-            # Check for text changes
-            try:
-                current_mac_text = pyperclip.paste()
-            except Exception as e:
-                current_mac_text = last_mac_text
-
-            if current_mac_text != last_mac_text:
-                should_send_text = True
-                
-                # If we just sent an image, check if the text is likely the filename
-                if image_sent:
-                    if any(current_mac_text.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp']):
-                         should_send_text = False
-                         print(f"Skipping text send because it looks like the filename of the image just sent: {current_mac_text}")
-
-                if should_send_text and current_mac_text.strip():
-                    for device in current_devices:
-                        send_text_to_device(device, current_mac_text)
-                        last_send_time[device] = time.time()
-                    last_android_clipboard = current_mac_text
-                
-                # Always update last_mac_text so we don't send it next time
-                last_mac_text = current_mac_text
-
-            # --- Android to Mac (Event Driven) ---
-            try:
-                # Check if any device reported a copy event
-                while True:
-                    event_device_id = clipboard_event_queue.get_nowait()
-                    
-                    current_time = time.time()
-                    
-                    # Check for feedback loop (ignore events shortly after we sent data)
-                    if event_device_id in last_send_time:
-                        if current_time - last_send_time[event_device_id] < 3.0:
-                            print(f"[{event_device_id}] Ignoring echo event (feedback loop protection)")
-                            continue
-
-                    # Check for rapid duplicate events (global debounce)
-                    if current_time - last_global_read_time < 1.0:
-                         continue
-
-                    print(f"[{event_device_id}] Detected copy event! Syncing...")
-                    
-                    clipboard_data = read_from_device(event_device_id)
-                    
-                    if clipboard_data is not None:
-                        if clipboard_data['type'] == 'text':
-                            text_data = clipboard_data['data']
-                            if text_data != last_android_clipboard and text_data != current_mac_text:
-                                if text_data.strip():
-                                    print(f"[{event_device_id}] Received text from Android: {text_data[:30]}..." if len(text_data) > 30 else f"[{event_device_id}] Received text from Android: {text_data}")
-                                    pyperclip.copy(text_data)
-                                    last_mac_text = text_data
-                                    last_android_clipboard = text_data
-                                    last_global_read_time = current_time
-                        
-                        elif clipboard_data['type'] == 'image':
-                            try:
-                                # Load image from raw bytes
-                                image_bytes = clipboard_data['data']
-                                image = Image.open(BytesIO(image_bytes))
-                                
-                                # Apply EXIF orientation
-                                try:
-                                    image = ImageOps.exif_transpose(image)
-                                except Exception as e:
-                                    print(f"[{event_device_id}] Warning: Could not apply EXIF orientation: {e}")
-                                
-                                # Check for duplicate image from Android
-                                current_image_hash = compute_image_hash(image)
-                                if current_image_hash == last_android_image_hash:
-                                    print(f"[{event_device_id}] Ignoring duplicate image event from Android")
-                                    continue
-
-                                # Set to Mac clipboard
-                                if set_mac_clipboard_image(image):
-                                    print(f"[{event_device_id}] Received image from Android: {clipboard_data['filename']} ({len(image_bytes)} bytes)")
-                                    last_mac_image_hash = current_image_hash
-                                    last_android_image_hash = current_image_hash
-                                    last_global_read_time = current_time
-                            except Exception as e:
-                                print(f"[{event_device_id}] Error processing image: {e}")
-            
-            except queue.Empty:
-                pass
-            
-            time.sleep(0.5)
-            
+        asyncio.run(SyncEngine(near_duplicate_threshold=args.near_duplicate_threshold, transcode_policy=policy,
+                               transport=transport, poll_scheduler=poll_scheduler,
+                               state_snapshot=state_snapshot).run())
     except KeyboardInterrupt:
         print("\nStopping clipboard sync.")
-        for monitor in monitors.values():
-            monitor.stop_event.set()
 
 if __name__ == "__main__":
     main()
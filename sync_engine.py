@@ -0,0 +1,624 @@
+import asyncio
+import functools
+import os
+import time
+from collections import deque
+
+import sync_clipboard as helpers
+from adb_transport import AdbTransport
+from device_registry import DeviceRegistry
+from event_scheduler import CoalescingScheduler
+from host_clipboard import default_backend
+from image_fingerprint import bytes_digest, is_near_duplicate, perceptual_hash
+from image_headers import probe_image
+from logcat_matcher import default_matcher
+from poll_scheduler import AdaptivePollScheduler, children_cpu_time
+from sync_metrics import metrics
+
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp']
+
+
+class SyncEngine:
+    """asyncio sync engine: host clipboard polling, logcat streams and device I/O on one event loop.
+
+    Logcat lines are matched as they arrive and copy events are handled
+    immediately, host clipboard changes are fanned out to all devices as
+    concurrent tasks, and transfers go through the transport (adb shell
+    sessions by default) so a slow device never blocks the loop. Blocking
+    clipboard calls run in worker threads, and CPU-heavy image work is
+    handed from those threads to the image worker processes.
+
+    With a state_snapshot, what the engine knows (host clipboard hashes,
+    device serials and what each device holds) is saved every
+    state_interval seconds and at shutdown, and picked up again at the
+    next start. Per-device state is only trusted if the device was seen
+    within device_state_max_age seconds, since the phone may have been
+    used in the meantime.
+    """
+
+    def __init__(self, poll_interval=None, send_timeout=15.0, echo_pair_window=0.3, read_debounce=1.0, logcat_matcher=None,
+                 near_duplicate_threshold=None, clipboard_backend=None, transcode_policy=None, event_settle=0.05,
+                 max_pending=32, transport=None, poll_scheduler=None, state_snapshot=None, state_interval=5.0,
+                 device_state_max_age=900.0, serial_max_age=30 * 24 * 3600.0):
+        # Adaptive host polling by default; a poll_interval pins it to a fixed rate
+        if poll_scheduler is None and poll_interval is not None:
+            poll_scheduler = AdaptivePollScheduler(min_interval=poll_interval, max_interval=poll_interval, cpu_budget=0)
+        self.poll_scheduler = poll_scheduler or AdaptivePollScheduler()
+        self.poll_wakeup = asyncio.Event()
+        # CPU seconds the current poll's clipboard probes have used
+        self.poll_cpu = 0.0
+        self.send_timeout = send_timeout
+        # How far apart a digest-less copy event (the system toast) and our
+        # app's digest line for the same write can be logged
+        self.echo_pair_window = echo_pair_window
+        self.read_debounce = read_debounce
+        # A burst of copy-event lines within this many seconds becomes one read
+        self.event_settle = event_settle
+        # Max dHash bit distance at which a changed image still counts as the
+        # same picture; None disables near-duplicate suppression
+        self.near_duplicate_threshold = near_duplicate_threshold
+        # Per-device image encoding, chosen from each device's measured push rate
+        self.transcode_policy = transcode_policy or helpers.transcode_policy
+
+        self.transport = transport or AdbTransport()
+        self.transport.on_write = self.expect_echo
+        self.transport.on_clipboard = self.on_device_clipboard
+        self.link_throughput = self.transport.link_throughput
+        self.clipboard = clipboard_backend or default_backend()
+        # Last value of the backend's cheap change primitive
+        self.last_change_token = None
+        self.registry = None
+        self.loop = None
+        self.logcat_tasks = {}
+        self.logcat_matcher = logcat_matcher or default_matcher
+        # device -> {"lines_read": n, "events_matched": n}
+        self.logcat_stats = {}
+        # One job per (direction, device): sends are latest-wins, reads coalesce
+        self.scheduler = CoalescingScheduler(max_pending=max_pending)
+        self.read_lock = asyncio.Lock()
+        self.tasks = set()
+
+        self.last_mac_text = ""
+        self.last_android_clipboard = ""
+        self.last_mac_image_hash = None
+        self.last_android_image_hash = None
+        self.last_image_phash = None
+        # Feedback-loop protection: device -> digests of content we wrote that
+        # have not been reported back yet, plus when we last wrote and when
+        # our app last confirmed one of those writes
+        self.sent_digests = {}
+        self.last_write_time = {}
+        self.last_echo_time = {}
+        # device -> digest of what it holds as far as we know (last sent or read)
+        self.device_content = {}
+        # device handle -> serial, for the devices attached right now
+        self.device_serials = {}
+
+        self.state_snapshot = state_snapshot
+        self.state_interval = state_interval
+        self.device_state_max_age = device_state_max_age
+        # Serials of handles not seen for this long are dropped from the state
+        self.serial_max_age = serial_max_age
+        # serial -> saved state of devices not attached right now
+        self.saved_devices = {}
+        # Track last read time globally to debounce rapid events across duplicate device entries
+        self.last_global_read_time = 0
+
+    def devices(self):
+        return self.registry.devices() if self.registry else []
+
+    def spawn(self, coro):
+        """Starts a background task and keeps a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        state = self.state_snapshot.load() if self.state_snapshot else {}
+        self.saved_devices = state.get("devices", {})
+        for saved in self.saved_devices.values():
+            # Devices attached at the last save were seen until then
+            saved.setdefault("seen_at", state.get("saved_at", 0))
+        saved_serials = state.get("serials", {})
+
+        # Start the registry first so device probes overlap with the host
+        # clipboard setup. It runs on its own thread; hop attach/detach events
+        # onto the loop.
+        self.registry = DeviceRegistry(
+            on_attach=lambda device: self.loop.call_soon_threadsafe(self.on_device_attached, device),
+            on_detach=lambda device: self.loop.call_soon_threadsafe(self.on_device_detached, device),
+            known_serials={handle: saved["serial"] for handle, saved in saved_serials.items()},
+            serials_seen={
+                handle: saved["seen_at"] if saved["seen_at"] is not None else state.get("saved_at", 0)
+                for handle, saved in saved_serials.items()
+            }
+        )
+        self.registry.start()
+        await self.seed_host_state(state)
+        metrics.add_gauges("host_poll", self.poll_scheduler.stats)
+        # Start the image workers in the background, ahead of the first large image
+        self.spawn(asyncio.to_thread(helpers.image_workers.warm_up))
+        if self.state_snapshot:
+            self.spawn(self.save_state_periodically())
+
+        try:
+            await self.poll_host_clipboard()
+        finally:
+            await self.shutdown()
+
+    async def seed_host_state(self, state):
+        """Records what is on the host clipboard now, so it is not sent out at startup.
+
+        The full image probe is only needed for a backend without a change
+        token. With one, an unchanged token reuses the hashes from the last
+        run; a changed one leaves the image unknown until the next change,
+        and device_content keeps devices from being sent what they have.
+        """
+        try:
+            self.last_mac_text = await asyncio.to_thread(self.clipboard.get_text)
+        except Exception:
+            pass
+        self.last_change_token = await asyncio.to_thread(self.clipboard.change_token)
+        if self.last_change_token is None:
+            image = await asyncio.to_thread(self.clipboard.get_image)
+            self.last_mac_image_hash = await asyncio.to_thread(helpers.compute_image_hash, image)
+        elif self.last_change_token == state.get("change_token"):
+            self.last_mac_image_hash = state.get("mac_image_hash")
+        self.last_android_image_hash = state.get("android_image_hash")
+
+    def snapshot_state(self):
+        now = time.time()
+        devices = {
+            serial: saved for serial, saved in self.saved_devices.items()
+            if now - saved["seen_at"] <= self.device_state_max_age
+        }
+        for device, serial in self.device_serials.items():
+            devices[serial] = self.device_state(device)
+        return {
+            "change_token": self.last_change_token,
+            "mac_image_hash": self.last_mac_image_hash,
+            "android_image_hash": self.last_android_image_hash,
+            "serials": self.registry.serial_map(self.serial_max_age) if self.registry else {},
+            "devices": devices,
+        }
+
+    def save_state(self, force=False):
+        try:
+            self.state_snapshot.save(self.snapshot_state(), force)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not save state to {self.state_snapshot.path}: {e}")
+
+    async def save_state_periodically(self):
+        while True:
+            await asyncio.sleep(self.state_interval)
+            # Only rewritten when something changed, so this is cheap while idle
+            self.save_state()
+
+    async def shutdown(self):
+        if self.registry is not None:
+            self.registry.stop()
+        for task in list(self.logcat_tasks.values()) + list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.logcat_tasks.values(), *self.tasks, return_exceptions=True)
+        self.logcat_tasks.clear()
+        if self.state_snapshot:
+            self.save_state(force=True)
+        await self.scheduler.close()
+        await self.transport.close_all()
+        helpers.image_workers.shutdown()
+
+    # --- Devices ---
+
+    def on_device_attached(self, device):
+        if device not in self.logcat_tasks:
+            self.restore_device_state(device)
+            self.logcat_tasks[device] = self.spawn(self.watch_logcat(device))
+            self.spawn(self.transport.attach(device))
+
+    def on_device_detached(self, device):
+        task = self.logcat_tasks.pop(device, None)
+        if task is not None:
+            task.cancel()
+        self.scheduler.discard(device)
+        serial = self.device_serials.pop(device, None)
+        if serial is not None:
+            self.saved_devices[serial] = dict(self.device_state(device), seen_at=time.time())
+        self.device_content.pop(device, None)
+        self.sent_digests.pop(device, None)
+        self.spawn(self.transport.detach(device))
+
+    def device_state(self, device):
+        return {
+            "content": self.device_content.get(device),
+            "sent": list(self.sent_digests.get(device, ())),
+        }
+
+    def restore_device_state(self, device):
+        """Picks up what the device held when it was last seen, if that was recent enough."""
+        serial = self.registry.serial(device)
+        self.device_serials[device] = serial
+        saved = self.saved_devices.pop(serial, None)
+        if not saved or time.time() - saved["seen_at"] > self.device_state_max_age:
+            return
+        if saved.get("content"):
+            self.device_content.setdefault(device, saved["content"])
+        if saved.get("sent"):
+            self.sent_digests.setdefault(device, deque(saved["sent"], maxlen=16))
+
+    async def watch_logcat(self, device):
+        """Streams the device's logcat and handles copy events as soon as they are logged."""
+        print(f"[{device}] Starting Logcat Monitor...")
+        # Clear logs first
+        metrics.count("subprocesses.adb", n=2, device=device)
+        clear = await asyncio.create_subprocess_exec(
+            "adb", "-s", device, "logcat", "-c",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await clear.wait()
+        finally:
+            await asyncio.shield(self.stop_process(clear))
+
+        stats = self.logcat_stats.setdefault(device, {"lines_read": 0, "events_matched": 0})
+        process = await asyncio.create_subprocess_exec(
+            *helpers.logcat_command(device, self.logcat_matcher),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=1024 * 1024
+        )
+        try:
+            while True:
+                raw = await process.stdout.readline()
+                if not raw:
+                    break
+                stats["lines_read"] += 1
+                metrics.count("logcat_lines", device=device)
+                line = raw.decode("utf-8", errors="replace")
+                if self.logcat_matcher.matches(line):
+                    stats["events_matched"] += 1
+                    metrics.count("logcat_events", device=device)
+                    digest = self.logcat_matcher.event_digest(line)
+                    if digest is not None and self.is_echo(device, digest):
+                        # Our own write bouncing back: drop it before any read
+                        metrics.count("echo_suppressed", device=device)
+                        continue
+                    self.poll_activity()
+                    self.scheduler.submit(
+                        ("receive", device),
+                        functools.partial(self.handle_device_event, device, time.time()),
+                        delay=self.event_settle
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[{device}] Logcat monitor error: {e}")
+        finally:
+            # Reap the child even though this task is being cancelled
+            await asyncio.shield(self.stop_process(process))
+
+    @staticmethod
+    async def stop_process(process, timeout=2.0):
+        """Terminates a child process and waits for it, killing it if it does not exit in time."""
+        if process.returncode is None:
+            try:
+                process.terminate()
+            except ProcessLookupError:
+                pass
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    # --- Mac to Android ---
+
+    async def poll_host_clipboard(self):
+        while True:
+            self.poll_cpu = 0.0
+            children_before = children_cpu_time()
+            changed = False
+            try:
+                changed = await self.check_host_clipboard()
+            except Exception as e:
+                print(f"Error checking Mac clipboard: {e}")
+            cpu = self.poll_cpu + children_cpu_time() - children_before
+            interval = self.poll_scheduler.record_poll(cpu, changed)
+            # Sleep until the next poll is due, or until activity tightens the schedule
+            self.poll_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.poll_wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def poll_activity(self):
+        """Tells the poll scheduler the user is active, e.g. a copy on a device."""
+        self.poll_scheduler.activity()
+        self.poll_wakeup.set()
+
+    async def poll_call(self, func, *args):
+        """Runs a host clipboard probe in a worker thread, adding its CPU time to the current poll."""
+        def call():
+            start = time.thread_time()
+            try:
+                return func(*args)
+            finally:
+                self.poll_cpu += time.thread_time() - start
+        return await asyncio.to_thread(call)
+
+    async def check_host_clipboard(self):
+        """Polls the host clipboard once and fans out changes; True if it found any."""
+        # Cheap gate: skip the full probing chain while the clipboard is unchanged
+        token = await self.poll_call(self.clipboard.change_token)
+        if token is not None and token == self.last_change_token:
+            metrics.count("host_polls_skipped")
+            return False
+        changed = token is not None
+        self.last_change_token = token
+        metrics.count("host_polls_extracted")
+
+        # Check for image changes FIRST
+        current_mac_image = await self.poll_call(self.clipboard.get_image)
+        current_mac_image_hash = await asyncio.to_thread(helpers.compute_image_hash, current_mac_image)
+        image_sent = False
+
+        if current_mac_image_hash is not None and current_mac_image_hash != self.last_mac_image_hash:
+            changed = True
+            self.last_mac_image_hash = current_mac_image_hash
+            if await self.is_near_duplicate_image(current_mac_image, current_mac_image_hash):
+                print("Skipping image send: near-duplicate of the last synced image")
+            else:
+                # New image in clipboard; each device gets an encoding suited to its link
+                self.fan_out("image", functools.partial(self.send_image, digest=current_mac_image_hash), current_mac_image,
+                             current_mac_image_hash)
+            image_sent = True
+
+        # Check for text changes
+        try:
+            current_mac_text = await self.poll_call(self.clipboard.get_text)
+        except Exception:
+            current_mac_text = self.last_mac_text
+
+        if current_mac_text != self.last_mac_text:
+            changed = True
+            should_send_text = True
+
+            # If we just sent an image, check if the text is likely the filename
+            if image_sent:
+                if any(current_mac_text.lower().endswith(ext) for ext in IMAGE_EXTENSIONS):
+                    should_send_text = False
+                    print(f"Skipping text send because it looks like the filename of the image just sent: {current_mac_text}")
+
+            if should_send_text and current_mac_text.strip():
+                self.fan_out("text", self.send_text, current_mac_text, bytes_digest(current_mac_text.encode("utf-8")))
+                self.last_android_clipboard = current_mac_text
+
+            # Always update last_mac_text so we don't send it next time
+            self.last_mac_text = current_mac_text
+        return changed
+
+    async def is_near_duplicate_image(self, image, digest):
+        """Checks image against the last synced one by perceptual hash, and remembers it."""
+        if self.near_duplicate_threshold is None:
+            return False
+        phash = await asyncio.to_thread(helpers.image_artifacts.get_or_create, digest, "phash", lambda: perceptual_hash(image))
+        duplicate = is_near_duplicate(phash, self.last_image_phash, self.near_duplicate_threshold)
+        self.last_image_phash = phash
+        return duplicate
+
+    def fan_out(self, description, send, payload, digest=None):
+        """Sends payload to every device concurrently without waiting for the result.
+
+        The device holds a single clipboard item, so a newer send cancels one
+        still in flight to the same device rather than queueing behind it.
+        """
+        for device in self.devices():
+            self.scheduler.submit(
+                ("send", device),
+                functools.partial(self.send_to_device, device, description, send, payload, digest),
+                supersede=True
+            )
+
+    async def send_to_device(self, device, description, send, payload, digest=None):
+        """Runs one send with the per-device timeout, unless the device already holds digest."""
+        if digest is not None and self.device_content.get(device) == digest:
+            metrics.count(f"sends_{description}_skipped", device=device)
+            print(f"[{device}] Device already has this {description}, not sending it again")
+            return
+        # Unknown until the write is confirmed
+        self.device_content.pop(device, None)
+        start = time.time()
+        try:
+            with metrics.timer(f"send_{description}", device, len(payload) if isinstance(payload, (str, bytes)) else 0):
+                ok = await asyncio.wait_for(send(device, payload), self.send_timeout)
+            metrics.count(f"sends_{description}_{'ok' if ok else 'failed'}", device=device)
+            if ok and digest is not None:
+                self.device_content[device] = digest
+            if not ok:
+                print(f"[{device}] {description} push failed after {time.time() - start:.1f}s")
+        except asyncio.TimeoutError:
+            metrics.count(f"sends_{description}_timeout", device=device)
+            print(f"[{device}] {description} push timeout after {time.time() - start:.1f}s")
+        except Exception as e:
+            print(f"[{device}] {description} push error: {e}")
+
+    def expect_echo(self, device, digest):
+        """Records content about to be written to the device so its change event can be recognised."""
+        self.sent_digests.setdefault(device, deque(maxlen=16)).append(digest)
+        self.last_write_time[device] = time.time()
+
+    def is_echo(self, device, digest):
+        """True (once) if digest is content we wrote to this device."""
+        sent = self.sent_digests.get(device)
+        if not sent or digest not in sent:
+            return False
+        sent.remove(digest)
+        self.last_echo_time[device] = time.time()
+        return True
+
+    async def send_text(self, device, text):
+        return await self.transport.send_text(device, text)
+
+    async def send_image(self, device, image, digest=None):
+        throughput = self.link_throughput.get(device)
+        encode = lambda: asyncio.to_thread(
+            helpers.prepare_image_transfer, device, image, digest, throughput, self.transcode_policy
+        )
+        return await self.transport.send_image(device, digest, encode)
+
+    # --- Android to Mac (Event Driven) ---
+
+    async def read_device(self, device):
+        return await self.transport.read_clipboard(device)
+
+    async def handle_device_event(self, device, event_time=None):
+        # Events without a digest (e.g. the system copy toast) fire for our own
+        # writes too. Only if we wrote to this device recently, give our app's
+        # digest line a moment to arrive and drop the event if it paired up.
+        event_time = event_time or time.time()
+        if self.sent_digests.get(device) and event_time - self.last_write_time.get(device, 0) < self.send_timeout:
+            await asyncio.sleep(self.echo_pair_window)
+        if abs(self.last_echo_time.get(device, 0) - event_time) <= self.echo_pair_window:
+            metrics.count("echo_suppressed", device=device)
+            print(f"[{device}] Ignoring echo event (content we just wrote)")
+            return
+        # The user copied something new on the device
+        self.device_content.pop(device, None)
+
+        async with self.read_lock:
+            current_time = time.time()
+            # Check for rapid duplicate events (global debounce)
+            if current_time - self.last_global_read_time < self.read_debounce:
+                return
+
+            print(f"[{device}] Detected copy event! Syncing...")
+            with metrics.timer("receive_total", device):
+                try:
+                    clipboard_data = await self.read_device(device)
+                except Exception as e:
+                    print(f"[{device}] Exception during read: {e}")
+                    return
+
+                await self.apply_clipboard(device, clipboard_data)
+
+    def on_device_clipboard(self, device, clipboard_data):
+        """Handles clipboard content the device pushed itself, with no read needed."""
+        self.poll_activity()
+        self.scheduler.submit(("receive", device), functools.partial(self.apply_pushed_clipboard, device, clipboard_data))
+
+    async def apply_pushed_clipboard(self, device, clipboard_data):
+        self.device_content.pop(device, None)
+        async with self.read_lock:
+            print(f"[{device}] Device pushed a clipboard change! Syncing...")
+            with metrics.timer("receive_total", device):
+                await self.apply_clipboard(device, clipboard_data)
+
+    async def apply_clipboard(self, device, clipboard_data):
+        if clipboard_data is None:
+            return
+        if clipboard_data['type'] == 'text':
+            await self.apply_text(device, clipboard_data['data'])
+        elif clipboard_data['type'] == 'image':
+            try:
+                await self.apply_image(device, clipboard_data)
+            finally:
+                if clipboard_data.get('path'):
+                    os.unlink(clipboard_data['path'])
+
+    async def apply_text(self, device, text_data):
+        self.device_content[device] = bytes_digest(text_data.encode("utf-8"))
+        if text_data != self.last_android_clipboard and text_data != self.last_mac_text and text_data.strip():
+            print(f"[{device}] Received text from Android: {text_data[:30]}..." if len(text_data) > 30 else f"[{device}] Received text from Android: {text_data}")
+            await asyncio.to_thread(self.clipboard.set_text, text_data)
+            self.last_mac_text = text_data
+            self.last_android_clipboard = text_data
+            self.last_global_read_time = time.time()
+
+    def can_pass_through(self, info):
+        """True if a received image can go to the host clipboard still encoded.
+
+        Needs a PNG/JPEG that is already upright, a backend with a change
+        token (so our own write is not picked up as a new host image), and
+        near-duplicate checks off, since those need decoded pixels.
+        """
+        return (
+            info is not None
+            and info['format'] in helpers.PASTEBOARD_CLASSES
+            and info['orientation'] in (None, 1)
+            and self.near_duplicate_threshold is None
+            and self.last_change_token is not None
+        )
+
+    async def apply_image(self, device, clipboard_data):
+        source = clipboard_data.get('path') or clipboard_data['data']
+        # Only the headers are read here, never the pixels
+        info = await asyncio.to_thread(probe_image, source)
+        if self.can_pass_through(info):
+            await self.apply_image_passthrough(device, clipboard_data, info)
+        else:
+            await self.apply_decoded_image(device, clipboard_data)
+
+    async def apply_image_passthrough(self, device, clipboard_data, info):
+        try:
+            digest = clipboard_data.get('digest') or bytes_digest(clipboard_data['data'])
+            # Digest of the encoded bytes, as the pixels are never decoded here
+            self.device_content[device] = digest
+            if digest == self.last_android_image_hash:
+                print(f"[{device}] Ignoring duplicate image event from Android")
+                return
+
+            path = clipboard_data.get('path')
+            if path is None:
+                # Small inline payload; the backend takes a file
+                with helpers.new_pull_file() as temp_file:
+                    temp_file.write(clipboard_data['data'])
+                path = temp_file.name
+            try:
+                ok = await asyncio.to_thread(self.clipboard.set_image_file, path, info['format'])
+            finally:
+                if path != clipboard_data.get('path'):
+                    os.unlink(path)
+            if not ok:
+                await self.apply_decoded_image(device, clipboard_data)
+                return
+
+            metrics.count("receive_passthrough", device=device)
+            size = clipboard_data.get('size') or len(clipboard_data['data'])
+            print(f"[{device}] Received image from Android: {clipboard_data['filename']} "
+                  f"({size} bytes, {info['width']}x{info['height']} {info['format']})")
+            # Skip our own write on the next poll; the pixels were never decoded,
+            # so there is no pixel digest to compare against
+            self.last_change_token = await asyncio.to_thread(self.clipboard.change_token)
+            self.last_mac_image_hash = None
+            self.last_android_image_hash = digest
+            self.last_global_read_time = time.time()
+        except Exception as e:
+            print(f"[{device}] Error processing image: {e}")
+
+    async def apply_decoded_image(self, device, clipboard_data):
+        try:
+            image_bytes = clipboard_data.get('path') or clipboard_data['data']
+            image = await asyncio.to_thread(helpers.decode_received_image, image_bytes, device)
+            metrics.count("receive_decoded", device=device)
+
+            # Check for duplicate image from Android
+            current_image_hash = await asyncio.to_thread(helpers.compute_image_hash, image)
+            self.device_content[device] = current_image_hash
+            if current_image_hash == self.last_android_image_hash:
+                print(f"[{device}] Ignoring duplicate image event from Android")
+                return
+            if await self.is_near_duplicate_image(image, current_image_hash):
+                print(f"[{device}] Ignoring near-duplicate image event from Android")
+                return
+
+            # Set to Mac clipboard
+            if await asyncio.to_thread(self.clipboard.set_image, image, current_image_hash):
+                size = clipboard_data.get('size') or len(clipboard_data['data'])
+                print(f"[{device}] Received image from Android: {clipboard_data['filename']} ({size} bytes)")
+                self.last_mac_image_hash = current_image_hash
+                self.last_android_image_hash = current_image_hash
+                self.last_global_read_time = time.time()
+        except Exception as e:
+            print(f"[{device}] Error processing image: {e}")
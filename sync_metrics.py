@@ -0,0 +1,229 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds, nbytes=0):
+        ms = seconds * 1000
+        index = 0
+        while index < len(BUCKETS_MS) and ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.bytes += nbytes
+
+    def percentile(self, pct):
+        """Upper bucket bound containing the given percentile."""
+        if not self.count:
+            return None
+        target = self.count * pct / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max, 2),
+            "bytes": self.bytes,
+            "buckets_ms": dict(zip([str(b) for b in BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, stage, device, nbytes):
+        self.metrics = metrics
+        self.stage = stage
+        self.device = device
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.device, self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+
+class Metrics:
+    """Per-stage timing histograms and counters, optionally per device.
+
+    Disabled by default: timer() then hands out a shared no-op context
+    manager and count() returns straight away, so instrumented code pays
+    one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        # name -> recent event dicts, e.g. the encoding chosen for each transfer
+        self.events = {}
+        self.max_events = 100
+        # name -> callable returning a dict of current values, read at snapshot time
+        self.gauges = {}
+        self.server = None
+
+    def timer(self, stage, device=None, nbytes=0):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, stage, device, nbytes)
+
+    def timed(self, stage):
+        """Decorator that times every call of a function under the given stage."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, stage, seconds, device=None, nbytes=0):
+        if not self.enabled:
+            return
+        with self.lock:
+            per_device = self.histograms.setdefault(stage, {})
+            histogram = per_device.get(device or "all")
+            if histogram is None:
+                histogram = per_device[device or "all"] = Histogram()
+            histogram.observe(seconds, nbytes)
+
+    def count(self, name, n=1, device=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            per_device = self.counters.setdefault(name, {})
+            per_device[device or "all"] = per_device.get(device or "all", 0) + n
+
+    def record(self, name, event):
+        """Keeps a bounded log of recent structured events under name."""
+        if not self.enabled:
+            return
+        with self.lock:
+            log = self.events.get(name)
+            if log is None:
+                log = self.events[name] = deque(maxlen=self.max_events)
+            log.append(dict(event, time=round(time.time(), 3)))
+
+    def add_gauges(self, name, source):
+        """Includes source()'s current values under gauges/name in every snapshot."""
+        with self.lock:
+            self.gauges[name] = source
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "histograms": {
+                    stage: {device: histogram.to_dict() for device, histogram in per_device.items()}
+                    for stage, per_device in self.histograms.items()
+                },
+                "counters": {name: dict(per_device) for name, per_device in self.counters.items()},
+                "events": {name: list(log) for name, log in self.events.items()},
+                "gauges": {name: source() for name, source in self.gauges.items()},
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.events.clear()
+            self.started = time.time()
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves the snapshot as JSON on http://host:port/metrics from a daemon thread."""
+        # Imported here so runs without --metrics-port skip loading http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot(), indent=2).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.enabled = True
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{self.server.server_port}/metrics")
+        return self.server
+
+    def start_dump(self, path, interval=60):
+        """Writes the snapshot to a JSON file every interval seconds from a daemon thread."""
+        self.enabled = True
+
+        def dump_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    temp_path = path + ".tmp"
+                    with open(temp_path, "w") as f:
+                        json.dump(self.snapshot(), f, indent=2)
+                    os.replace(temp_path, path)
+                except Exception as e:
+                    print(f"Could not write metrics dump: {e}")
+
+        threading.Thread(target=dump_loop, daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+# Shared instance used by all instrumented modules
+metrics = Metrics()
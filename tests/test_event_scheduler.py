@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_scheduler import CoalescingScheduler  # noqa: E402
+
+KEY = ("send", "emulator-5554")
+
+
+class CoalescingSchedulerTest(unittest.TestCase):
+    def run_async(self, coro):
+        return asyncio.run(asyncio.wait_for(coro, 5))
+
+    def test_supersede_before_first_step_runs_the_newer_job(self):
+        async def scenario():
+            scheduler = CoalescingScheduler()
+            ran = []
+
+            async def job(name):
+                ran.append(name)
+
+            # The first task is cancelled before it ever starts running
+            scheduler.submit(KEY, lambda: job("a"))
+            scheduler.submit(KEY, lambda: job("b"), supersede=True)
+            while scheduler.running or scheduler.pending:
+                await asyncio.sleep(0.01)
+            scheduler.submit(KEY, lambda: job("c"))
+            while scheduler.running:
+                await asyncio.sleep(0.01)
+            return ran
+
+        self.assertEqual(self.run_async(scenario()), ["b", "c"])
+
+    def test_submit_after_discard_runs(self):
+        async def scenario():
+            scheduler = CoalescingScheduler()
+            started = asyncio.Event()
+            ran = []
+
+            async def hang():
+                started.set()
+                await asyncio.sleep(60)
+
+            async def job():
+                ran.append("after")
+
+            scheduler.submit(KEY, hang)
+            await started.wait()
+            scheduler.discard(KEY[1])
+            scheduler.submit(KEY, job)
+            while scheduler.running or scheduler.pending:
+                await asyncio.sleep(0.01)
+            return ran
+
+        self.assertEqual(self.run_async(scenario()), ["after"])
+
+    def test_discard_before_first_step_frees_the_key(self):
+        async def scenario():
+            scheduler = CoalescingScheduler()
+            ran = []
+
+            async def job():
+                ran.append("job")
+
+            scheduler.submit(KEY, job)
+            scheduler.discard(KEY[1])
+            await asyncio.sleep(0.05)
+            scheduler.submit(KEY, job)
+            while scheduler.running or scheduler.pending:
+                await asyncio.sleep(0.01)
+            return ran
+
+        self.assertEqual(self.run_async(scenario()), ["job"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+from image_transcoder import LinkThroughput
+
+
+class Transport:
+    """How the sync engine moves clipboard content to and from devices.
+
+    send_text/send_image write to the device clipboard, read_clipboard pulls
+    the device clipboard after a copy event. Transports whose devices push
+    their own changes call on_clipboard(device, clipboard_data) with the same
+    dicts read_clipboard returns. on_write(device, digest) is called with the
+    payload digest just before content is written, so the engine can tell its
+    own writes apart when the device reports them back. link_throughput is
+    the per-device push rate the engine picks image encodings from.
+    """
+
+    name = "base"
+
+    def __init__(self, link_throughput=None):
+        self.link_throughput = link_throughput or LinkThroughput()
+        self.on_write = None
+        self.on_clipboard = None
+
+    async def attach(self, device):
+        pass
+
+    async def detach(self, device):
+        pass
+
+    async def close_all(self):
+        pass
+
+    async def send_text(self, device, text):
+        raise NotImplementedError
+
+    async def send_image(self, device, digest, encode):
+        """Sends an image; encode() is an async callable returning (plan, bytes), or None if
+        the image cannot be sent, and is only awaited if the bytes have to travel."""
+        raise NotImplementedError
+
+    async def read_clipboard(self, device):
+        raise NotImplementedError
+
+    def expect_write(self, device, digest):
+        if self.on_write is not None:
+            self.on_write(device, digest)